@@ -0,0 +1,303 @@
+# Benchmark suite
+
+"""
+Seeded maps over a range of sizes, wall densities and layouts ('open'
+is rand_grid, 'maze' is rand_maze), the same random queries on each,
+and every search run over those queries.  Per map and search it
+records latency percentiles, expansions (where the search counts them)
+and peak traced memory of one query, and checks that all optimal
+searches agree on every path cost.  Results go to a JSON file, so two
+versions can be diffed.
+
+  python bench.py --sizes 32 64 128 --queries 20 --out before.json
+
+Searches that are slow on big maps have a cell limit and are skipped
+above it; --no-limits runs everything everywhere.  Building a contraction
+hierarchy is the slow part of ch_search, so --ch-dir saves each one and
+later runs load it (setup_ms shows which).
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pqueue import IndexedPQueue, BucketQueue
+import grid_search
+from grid_search import SearchStats
+import id_search
+import hpa_search
+import landmarks
+import ch_search
+import dstar_lite
+import np_search
+from path_cache import path_cost
+import uGrid
+
+
+SIZES = (32, 64, 128, 256, 512, 1024, 2048)
+DENSITIES = (0.0, 0.1, 0.2, 0.3)
+LAYOUTS = ('open', 'maze')
+INF = float('inf')
+CH_DIR = None  # --ch-dir: saved contraction hierarchies
+
+
+# ---------------------------------------------------------------------
+
+# Each engine is (name, prepare, optimal, max_cells).  prepare(grid)
+# does any preprocessing and returns query(a, b) -> (path, expanded),
+# where expanded is None if the search can't count it.
+
+def with_stats(search, **kw):
+  def prepare(grid):
+    def query(a, b):
+      stats = SearchStats()
+      path = search(grid, a, b, stats=stats, **kw)
+      return path, stats.expanded
+    return query
+  return prepare
+
+
+def plain(search, **kw):
+  def prepare(grid):
+    return lambda a, b: (search(grid, a, b, **kw), None)
+  return prepare
+
+
+def prepare_ara(grid):
+  def query(a, b):
+    search = grid_search.AnytimeAStar(grid, a, b)
+    path, bound = search.run()
+    return path, search.expanded
+  return query
+
+
+def prepare_workspace(grid):
+  ws = id_search.Workspace(grid)
+  return lambda a, b: (ws.astar(a, b), None)
+
+
+def prepare_numpy(grid):
+  def query(a, b):
+    dist = np_search.bfs_distances(grid, [a])
+    return np_search.path_from_distances(grid, dist, b), None
+  return query
+
+
+def prepare_hpa(grid):
+  hierarchy = hpa_search.Hierarchy(grid)
+  return lambda a, b: (hierarchy.search(a, b), None)
+
+
+def prepare_alt(grid):
+  table = landmarks.build_landmarks(grid)
+  return with_stats(grid_search.astar_search, heuristic=table.heuristic)(grid)
+
+
+def prepare_ch(grid):
+  if CH_DIR is None:
+    ch = ch_search.build_ch(grid)
+  else:
+    ch = ch_search.cached_ch(grid, CH_DIR)
+  return lambda a, b: (ch.search(a, b), None)
+
+
+def prepare_dstar(grid):
+  def query(a, b):
+    planner = dstar_lite.DStarLite(grid, a, b)
+    try:
+      return planner.plan(), planner.expanded
+    finally:
+      planner.close()
+  return query
+
+
+ENGINES = [
+  ('fsp', with_stats(grid_search.fsp), True, 256 * 256),
+  ('find_shortest_path', with_stats(grid_search.find_shortest_path), True, 64 * 64),
+  ('bfs_search', with_stats(grid_search.bfs_search), True, None),
+  ('dijkstra_search', with_stats(grid_search.dijkstra_search), True, 512 * 512),
+  ('dijkstra_search/bucket',
+   with_stats(grid_search.dijkstra_search, queue=BucketQueue), True, 512 * 512),
+  ('astar_search', with_stats(grid_search.astar_search), True, None),
+  ('astar_search/indexed',
+   with_stats(grid_search.astar_search, queue=IndexedPQueue), True, None),
+  ('astar_search/bucket',
+   with_stats(grid_search.astar_search, queue=BucketQueue), True, None),
+  ('bi_bfs_search', with_stats(grid_search.bi_bfs_search), True, None),
+  ('bi_dijkstra_search', with_stats(grid_search.bi_dijkstra_search), True, 512 * 512),
+  ('bi_astar_search', with_stats(grid_search.bi_astar_search), True, None),
+  ('jps_search', with_stats(grid_search.jps_search), True, None),
+  ('fringe_search', with_stats(grid_search.fringe_search), True, 128 * 128),
+  ('fringe_search/table',
+   with_stats(grid_search.fringe_search, table_size=4096), True, 128 * 128),
+  ('ida_search', with_stats(grid_search.ida_search, table_size=4096), True, 32 * 32),
+  ('ara_search', prepare_ara, True, 512 * 512),
+  ('bit_bfs_search', with_stats(grid_search.bit_bfs_search), True, None),
+  ('bfs_search_id', plain(id_search.bfs_search_id), True, None),
+  ('dijkstra_search_id', plain(id_search.dijkstra_search_id), True, None),
+  ('astar_search_id', plain(id_search.astar_search_id), True, None),
+  ('workspace_astar', prepare_workspace, True, None),
+  ('np_bfs_distances', prepare_numpy, True, None),
+  ('alt_astar', prepare_alt, True, 256 * 256),
+  ('ch_search', prepare_ch, True, 128 * 128),
+  ('dstar_lite', prepare_dstar, True, 128 * 128),
+  ('hpa_search', prepare_hpa, False, None),
+]
+
+
+# ---------------------------------------------------------------------
+
+def percentile(values, q):
+  """ nearest-rank percentile of sorted values """
+  if not values:
+    return None
+  k = math.ceil(q / 100 * len(values)) - 1
+  return values[max(0, k)]
+
+
+def make_map(layout, size, density):
+  if layout == 'maze':
+    return uGrid.rand_maze(size, size, loops=size)
+  return uGrid.rand_grid(size, size, int(density * size * size))
+
+
+def map_queries(grid, n):
+  return [(uGrid.rand_open(grid), uGrid.rand_open(grid)) for i in range(n)]
+
+
+def run_engine(grid, queries, prepare):
+  """ timings, expansions, costs and peak memory of one engine """
+  t0 = time.perf_counter()
+  query = prepare(grid)
+  setup = time.perf_counter() - t0
+  times, expanded, costs = [], [], []
+  for a, b in queries:
+    t0 = time.perf_counter()
+    path, n = query(a, b)
+    times.append(time.perf_counter() - t0)
+    if n is not None:
+      expanded.append(n)
+    if path and (path[0] != a or path[-1] != b):
+      raise ValueError(f'path does not join {a} and {b}')
+    costs.append(path_cost(grid, path))
+  a, b = queries[0]
+  tracemalloc.start()
+  query(a, b)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  times.sort()
+  result = {
+    'setup_ms': setup * 1e3,
+    'mean_ms': sum(times) / len(times) * 1e3,
+    'p50_ms': percentile(times, 50) * 1e3,
+    'p90_ms': percentile(times, 90) * 1e3,
+    'p99_ms': percentile(times, 99) * 1e3,
+    'max_ms': times[-1] * 1e3,
+    'expanded_mean': sum(expanded) / len(expanded) if expanded else None,
+    'peak_kb': peak / 1e3,
+    'found': sum(c < INF for c in costs),
+  }
+  return result, costs
+
+
+def bench_map(layout, size, density, engines, nqueries, seed, limits=True):
+  """ run engines over one seeded map; returns its record and any
+      cost disagreements between the optimal engines
+  """
+  random.seed(f'{seed}-{layout}-{size}-{density}')
+  t0 = time.perf_counter()
+  grid, start, goal = make_map(layout, size, density)
+  build = time.perf_counter() - t0
+  queries = map_queries(grid, nqueries)
+  record = {'layout': layout, 'size': size,
+            'density': density if layout == 'open' else None,
+            'walls': grid.nwalls, 'build_ms': build * 1e3, 'results': {}}
+  optimal = {}
+  other = {}
+  for name, prepare, exact, max_cells in engines:
+    if limits and max_cells is not None and size * size > max_cells:
+      continue
+    if name.startswith('np_') and np_search.numpy is None:
+      continue
+    result, costs = run_engine(grid, queries, prepare)
+    record['results'][name] = result
+    (optimal if exact else other)[name] = costs
+  mismatches = []
+  best = [min(c) for c in zip(*optimal.values())] if optimal else []
+  for name, costs in optimal.items():
+    for (a, b), c, lo in zip(queries, costs, best):
+      if c != lo:
+        mismatches.append({'layout': layout, 'size': size,
+                           'density': record['density'], 'engine': name,
+                           'query': [a, b], 'cost': None if c == INF else c,
+                           'best': None if lo == INF else lo})
+  for name, costs in other.items():
+    ratios = [c / lo for c, lo in zip(costs, best) if 0 < lo < INF]
+    if ratios:
+      record['results'][name]['cost_ratio'] = sum(ratios) / len(ratios)
+  return record, mismatches
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='benchmark the grid searches')
+  parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+  parser.add_argument('--densities', type=float, nargs='+', default=DENSITIES)
+  parser.add_argument('--layouts', nargs='+', default=LAYOUTS, choices=LAYOUTS)
+  parser.add_argument('--engines', nargs='+', default=None,
+                      help='names to run (default all)')
+  parser.add_argument('--queries', type=int, default=20)
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--no-limits', dest='limits', action='store_false',
+                      help='run slow engines on every map size')
+  parser.add_argument('--ch-dir', default=None,
+                      help='keep contraction hierarchies here between runs')
+  parser.add_argument('--out', default='bench_results.json')
+  args = parser.parse_args(argv)
+  global CH_DIR
+  CH_DIR = args.ch_dir
+
+  engines = [e for e in ENGINES if args.engines is None or e[0] in args.engines]
+  maps, mismatches = [], []
+  for layout in args.layouts:
+    for size in args.sizes:
+      # a maze has one layout per size, whatever the density
+      for density in args.densities if layout == 'open' else (None,):
+        record, bad = bench_map(layout, size, density, engines,
+                                args.queries, args.seed, args.limits)
+        maps.append(record)
+        mismatches += bad
+        print(f"{layout} {size}x{size}" +
+              (f" density {density}" if density is not None else "") +
+              f" walls={record['walls']}")
+        for name, r in record['results'].items():
+          exp = r['expanded_mean']
+          print(f"  {name:24s} p50={r['p50_ms']:9.2f} p99={r['p99_ms']:9.2f} ms "
+                f"expanded={'-' if exp is None else f'{exp:.0f}':>8s} "
+                f"peak={r['peak_kb']:8.0f} kB")
+  results = {
+    'meta': {'seed': args.seed, 'queries': args.queries,
+             'python': platform.python_version(), 'limits': args.limits},
+    'maps': maps,
+    'mismatches': mismatches,
+  }
+  with open(args.out, 'w') as f:
+    json.dump(results, f, indent=1, sort_keys=True)
+  for m in mismatches:
+    print(f"cost mismatch: {m}")
+  print(f"{len(maps)} maps, {len(mismatches)} cost mismatches -> {args.out}")
+  return 1 if mismatches else 0
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  sys.exit(main())
@@ -0,0 +1,370 @@
+# Contraction hierarchy for static grids
+
+"""
+Offline preprocessing for maps that never change.  Every cell is a
+vertex with edges to its neighbors weighted by Grid.cost.  Vertices are
+contracted one at a time in order of edge difference; when the only
+cheap way between two neighbors of the contracted vertex runs through
+it, a shortcut edge is added.  A query is a bidirectional Dijkstra that
+only climbs to higher ranked vertices, followed by unpacking the
+shortcuts back into grid cells.
+
+The result is stored as two CSR tables of upward edges (out from a
+vertex, and into a vertex) and can be saved and loaded with arrays.
+Costs are int64, since shortcuts add up uint16 weights.  The file keeps
+a CRC of the grid's walls and weights, so a hierarchy is only used
+with the map it was built for.  Build once per map, offline, and query
+the saved file:
+
+  python ch_search.py build maps/arena.map arena.ch
+  python ch_search.py query arena.ch maps/arena.map.scen
+
+A map is a MovingAI .map or a grid_file .grd.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from array import array
+from heapq import heapify, heappush, heappop
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from grid_search import dijkstra_search
+import grid_file
+import movingai
+import uGrid
+
+
+INF = float('inf')
+MAGIC = b'CH02'
+HEADER = struct.Struct('<4siiiiI')  # magic, rows, cols, out edges, in edges, crc
+TYPES = ('i', 'i', 'q', 'i')  # off, other end, cost, mid
+
+
+def grid_crc(graph):
+  """ CRC-32 of the walls and weights of graph """
+  crc = zlib.crc32(bytes(graph.cells))
+  if graph.weight is not None:
+    crc = zlib.crc32(graph.weight.tobytes(), crc)
+  return crc
+
+
+def to_csr(n, edges):
+  """ per-vertex edge lists [(other, cost, mid)] as CSR arrays """
+  off = array('i', [0])
+  other, cost, mid = array('i'), array('q'), array('i')
+  for v in range(n):
+    for w, (c, m) in edges[v]:
+      other.append(w)
+      cost.append(c)
+      mid.append(m)
+    off.append(len(other))
+  return off, other, cost, mid
+
+
+class ContractionHierarchy:
+  """ Upward edges of a contracted grid """
+
+  def __init__(self, rows, cols, up_out, up_in, crc=0):
+    self.rows = rows
+    self.cols = cols
+    self.up_out = up_out  # (off, to, cost, mid)
+    self.up_in = up_in  # (off, from, cost, mid)
+    self.crc = crc  # grid_crc of the grid it was built from
+
+  def check(self, graph):
+    """ raise ValueError unless this hierarchy was built from graph """
+    if (graph.rows, graph.cols) != (self.rows, self.cols):
+      raise ValueError(f'hierarchy is for a {self.rows}x{self.cols} grid')
+    if grid_crc(graph) != self.crc:
+      raise ValueError('hierarchy was built from a different grid')
+
+  def find_mid(self, table, v, other):
+    """ middle vertex of the upward edge between v and other """
+    off, ends, cost, mid = table
+    for i in range(off[v], off[v + 1]):
+      if ends[i] == other:
+        return mid[i]
+    raise KeyError((v, other))
+
+  def unpack(self, u, w, m, path):
+    """ append the vertices after u on edge u -> w to path """
+    stack = [(u, w, m)]
+    while stack:
+      u, w, m = stack.pop()
+      if m < 0:
+        path.append(w)
+        continue
+      stack.append((m, w, self.find_mid(self.up_out, m, w)))
+      stack.append((u, m, self.find_mid(self.up_in, m, u)))
+
+  def search(self, a_node, b_node):
+    """ shortest path as a list of (r, c) """
+    cols = self.cols
+    s = a_node[0] * cols + a_node[1]
+    t = b_node[0] * cols + b_node[1]
+    if s == t:
+      return [a_node]
+    tables = (self.up_out, self.up_in)
+    dist = ({s: 0}, {t: 0})
+    parent = ({s: None}, {t: None})  # vertex -> (previous vertex, mid)
+    heaps = ([(0, s)], [(0, t)])
+    best, meet = INF, -1
+    side = 1
+    while 1:
+      live = [i for i in (0, 1) if heaps[i] and heaps[i][0][0] < best]
+      if not live:
+        break
+      side = live[0] if len(live) == 1 else 1 - side
+      heap = heaps[side]
+      d, x = heappop(heap)
+      if d > dist[side][x]:
+        continue
+      if x in dist[1 - side] and d + dist[1 - side][x] < best:
+        best, meet = d + dist[1 - side][x], x
+      off, ends, cost, mid = tables[side]
+      near, came = dist[side], parent[side]
+      for i in range(off[x], off[x + 1]):
+        y = ends[i]
+        nd = d + cost[i]
+        if nd < near.get(y, INF):
+          near[y] = nd
+          came[y] = (x, mid[i])
+          heappush(heap, (nd, y))
+    if meet < 0:
+      return []
+    head = []
+    x = meet
+    while parent[0][x] is not None:
+      prev, m = parent[0][x]
+      head.append((prev, x, m))
+      x = prev
+    head.reverse()
+    tail = []
+    x = meet
+    while parent[1][x] is not None:
+      nxt, m = parent[1][x]
+      tail.append((x, nxt, m))
+      x = nxt
+    path = [s]
+    for u, w, m in head + tail:
+      self.unpack(u, w, m, path)
+    return [divmod(k, cols) for k in path]
+
+  def save(self, filename):
+    with open(filename, 'wb') as f:
+      f.write(HEADER.pack(MAGIC, self.rows, self.cols,
+                          len(self.up_out[1]), len(self.up_in[1]), self.crc))
+      for table in (self.up_out, self.up_in):
+        for arr in table:
+          arr.tofile(f)
+
+
+def load_ch(filename, graph=None):
+  """ load a hierarchy saved by ContractionHierarchy.save, checking it
+      against graph
+  """
+  with open(filename, 'rb') as f:
+    magic, rows, cols, n_out, n_in, crc = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+      raise ValueError(f'{filename} is not a contraction hierarchy')
+    tables = []
+    for m in (n_out, n_in):
+      table = []
+      for code, size in zip(TYPES, (rows * cols + 1, m, m, m)):
+        arr = array(code)
+        arr.fromfile(f, size)
+        table.append(arr)
+      tables.append(tuple(table))
+  ch = ContractionHierarchy(rows, cols, tables[0], tables[1], crc)
+  if graph is not None:
+    ch.check(graph)
+  return ch
+
+
+def cached_ch(graph, path):
+  """ the hierarchy for graph saved in directory path, built and saved
+      there first if there is none
+  """
+  filename = os.path.join(path, f'{graph.rows}x{graph.cols}-{grid_crc(graph):08x}.ch')
+  try:
+    return load_ch(filename, graph)
+  except FileNotFoundError:
+    pass
+  ch = build_ch(graph)
+  os.makedirs(path, exist_ok=True)
+  ch.save(filename)
+  return ch
+
+
+def read_map(filename):
+  """ Grid from a MovingAI .map or a grid_file .grd """
+  if filename.endswith('.map'):
+    return movingai.load_map(filename)
+  return grid_file.load_grid(filename)
+
+
+def build_ch(graph, witness_limit=40):
+  """ Contract every cell of graph.  Witness searches settle at most
+      witness_limit vertices; when they give up a shortcut is added,
+      which costs space but never correctness.
+  """
+  rows, cols = graph.rows, graph.cols
+  n = rows * cols
+  out = [{} for k in range(n)]  # v -> {w: (cost, mid)}
+  inn = [{} for k in range(n)]
+  for k in range(n):
+    cp = divmod(k, cols)
+    for np in graph.neighbors(cp):
+      j = np[0] * cols + np[1]
+      c = graph.cost(cp, np)
+      out[k][j] = (c, -1)
+      inn[j][k] = (c, -1)
+
+  def witness(src, skip, limit):
+    """ costs from src without passing skip, up to limit """
+    dist = {src: 0}
+    heap = [(0, src)]
+    settled = 0
+    while heap:
+      d, x = heappop(heap)
+      if d > dist[x]:
+        continue
+      settled += 1
+      if d >= limit or settled > witness_limit:
+        break
+      for y, (c, m) in out[x].items():
+        nd = d + c
+        if y != skip and nd < dist.get(y, INF):
+          dist[y] = nd
+          heappush(heap, (nd, y))
+    return dist
+
+  def shortcuts(v):
+    """ shortcuts needed to contract v """
+    needed = []
+    for u, (a, m) in inn[v].items():
+      targets = {w: a + b for w, (b, m) in out[v].items() if w != u}
+      if not targets:
+        continue
+      dist = witness(u, v, max(targets.values()))
+      for w, c in targets.items():
+        if dist.get(w, INF) > c:
+          needed.append((u, w, c))
+    return needed
+
+  deleted = array('i', [0]) * n
+  up_out = [None] * n
+  up_in = [None] * n
+
+  def priority(v):
+    needed = shortcuts(v)
+    return len(needed) - len(inn[v]) - len(out[v]) + deleted[v], needed
+
+  heap = [(priority(v)[0], v) for v in range(n)]
+  heapify(heap)
+  while heap:
+    p, v = heappop(heap)
+    p, needed = priority(v)
+    if heap and p > heap[0][0]:
+      heappush(heap, (p, v))
+      continue
+    up_out[v] = list(out[v].items())
+    up_in[v] = list(inn[v].items())
+    for w in out[v]:
+      del inn[w][v]
+      deleted[w] += 1
+    for u in inn[v]:
+      del out[u][v]
+      deleted[u] += 1
+    out[v], inn[v] = {}, {}
+    for u, w, c in needed:
+      old = out[u].get(w)
+      if old is None or c < old[0]:
+        out[u][w] = (c, v)
+        inn[w][u] = (c, v)
+  return ContractionHierarchy(rows, cols, to_csr(n, up_out), to_csr(n, up_in),
+                              grid_crc(graph))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='contraction hierarchies for static maps')
+  commands = parser.add_subparsers(dest='command', required=True)
+  build = commands.add_parser('build', help='contract a map and save the hierarchy')
+  build.add_argument('map', help='.map or .grd file')
+  build.add_argument('out')
+  build.add_argument('--witness-limit', type=int, default=40)
+  query = commands.add_parser('query', help='run a .scen file on a saved hierarchy')
+  query.add_argument('ch')
+  query.add_argument('scen')
+  query.add_argument('--map', default=None,
+                     help='map file (default: the one each scenario names)')
+  query.add_argument('--exact', action='store_true',
+                     help='lengths must match (4-connected scenarios)')
+  query.add_argument('--limit', type=int, default=None)
+  args = parser.parse_args(argv)
+
+  if args.command == 'build':
+    grid = read_map(args.map)
+    t0 = time.perf_counter()
+    ch = build_ch(grid, args.witness_limit)
+    dt = time.perf_counter() - t0
+    ch.save(args.out)
+    print(f"{grid.rows}x{grid.cols} contracted in {dt:.1f} s, "
+          f"{len(ch.up_out[1]) + len(ch.up_in[1])} upward edges, "
+          f"{os.path.getsize(args.out) / 1e6:.1f} MB -> {args.out}")
+    return 0
+
+  t0 = time.perf_counter()
+  ch = load_ch(args.ch)
+  print(f"loaded {args.ch} in {(time.perf_counter() - t0) * 1e3:.1f} ms")
+  checked = set()
+
+  def search(grid, a, b):
+    if id(grid) not in checked:
+      ch.check(grid)
+      checked.add(id(grid))
+    return ch.search(a, b)
+
+  t0 = time.perf_counter()
+  times, failed = movingai.run_scen(args.scen, search, args.map, args.exact, args.limit)
+  return movingai.report('ch_search', times, failed, time.perf_counter() - t0)
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ build, save, reload and query a hierarchy """
+  grid, start, goal = uGrid.rand_grid(100, 100, 2500)
+  t0 = time.perf_counter()
+  ch = build_ch(grid)
+  t1 = time.perf_counter()
+  print(f"built in {t1-t0:.1f} s, {len(ch.up_out[1]) + len(ch.up_in[1])} upward edges")
+  filename = os.path.join(tempfile.gettempdir(), 'grid.ch')
+  ch.save(filename)
+  ch = load_ch(filename, grid)
+  os.remove(filename)
+  for i in range(5):
+    a, b = uGrid.rand_open(grid), uGrid.rand_open(grid)
+    t0 = time.perf_counter()
+    p0 = dijkstra_search(grid, a, b)
+    t1 = time.perf_counter()
+    p1 = ch.search(a, b)
+    t2 = time.perf_counter()
+    print(f"dijkstra len={len(p0)} {(t1-t0)*1e3:7.2f} ms | "
+          f"ch len={len(p1)} {(t2-t1)*1e3:7.2f} ms")
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  if len(sys.argv) > 1:
+    sys.exit(main())
+  test1()
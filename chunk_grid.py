@@ -0,0 +1,273 @@
+# Chunked, lazily loaded grid without bounds
+
+"""
+An open-world grid cut into square chunks of size x size cells.  A
+chunk is loaded from its store the first time a search touches it and
+kept in an LRU of at most capacity chunks; the least recently used one
+is evicted (and saved first, if it was edited) to make room.  Chunk
+(i, j) holds rows i*size .. i*size + size - 1, and negative
+coordinates work the same way, so there is no edge to the world.
+
+ChunkedGrid has the interface the searches use (neighbors, cost,
+passable, add_wall, ...), so astar_search runs on it unchanged.  With
+no bounds, a search for an unreachable goal never ends; give the
+store walls around the region, or use a search with a limit.
+
+The counters loads, hits and evictions are per grid; reset_stats
+before a query to read them per query.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from array import array
+from collections import OrderedDict
+import os
+import random
+import tempfile
+import time
+from grid_search import astar_search
+
+
+class Chunk:
+  """ Walls and weights of one chunk """
+
+  def __init__(self, cells, weight=None):
+    self.cells = cells
+    self.weight = weight
+    self.dirty = False
+
+
+def random_fill(density, seed=0):
+  """ fill(key, size) that scatters walls, the same for each key every
+      time it is asked for
+  """
+  def fill(key, size):
+    rng = random.Random(f'{seed}-{key[0]}-{key[1]}')
+    return bytearray(rng.random() < density for k in range(size * size))
+  return fill
+
+
+class MemoryStore:
+  """ Chunks in a dict.  fill(key, size) makes the walls of a chunk
+      that has never been saved (all open without it).
+  """
+
+  def __init__(self, fill=None):
+    self.fill = fill
+    self.saved = {}
+
+  def load(self, key, size):
+    if key in self.saved:
+      cells, data = self.saved[key]
+      weight = None
+      if data is not None:
+        weight = array('H')
+        weight.frombytes(data)
+      return Chunk(bytearray(cells), weight)
+    if self.fill is None:
+      return Chunk(bytearray(size * size))
+    return Chunk(self.fill(key, size))
+
+  def save(self, key, chunk):
+    data = None if chunk.weight is None else chunk.weight.tobytes()
+    self.saved[key] = (bytes(chunk.cells), data)
+
+
+class DirStore(MemoryStore):
+  """ One file per chunk in path, named i_j.chunk: size*size wall
+      bytes, followed by size*size uint16 weights if it has any.
+  """
+
+  def __init__(self, path, fill=None):
+    super().__init__(fill)
+    self.path = path
+    os.makedirs(path, exist_ok=True)
+
+  def filename(self, key):
+    return os.path.join(self.path, f'{key[0]}_{key[1]}.chunk')
+
+  def load(self, key, size):
+    try:
+      with open(self.filename(key), 'rb') as f:
+        data = f.read()
+    except FileNotFoundError:
+      return super().load(key, size)
+    n = size * size
+    weight = None
+    if len(data) > n:
+      weight = array('H')
+      weight.frombytes(data[n:n + 2 * n])
+    return Chunk(bytearray(data[:n]), weight)
+
+  def save(self, key, chunk):
+    with open(self.filename(key), 'wb') as f:
+      f.write(chunk.cells)
+      if chunk.weight is not None:
+        f.write(chunk.weight.tobytes())
+
+
+class ChunkedGrid:
+  """ Unbounded grid of lazily loaded chunks """
+
+  def __init__(self, store, size=64, capacity=256):
+    self.store = store
+    self.size = size
+    self.capacity = capacity
+    self.chunks = OrderedDict()  # (i, j) -> Chunk, oldest first
+    self.last_key = None
+    self.last = None
+    self.loads = 0
+    self.hits = 0
+    self.evictions = 0
+    self.version = 0
+    self.watchers = []
+    self.components = None
+
+  def stats(self):
+    return {'resident': len(self.chunks), 'loads': self.loads,
+            'hits': self.hits, 'evictions': self.evictions}
+
+  def reset_stats(self):
+    self.loads = self.hits = self.evictions = 0
+
+  def chunk(self, key):
+    """ the chunk at key, loading it (and evicting) if need be """
+    if key == self.last_key:
+      return self.last
+    chunks = self.chunks
+    chunk = chunks.get(key)
+    if chunk is None:
+      while len(chunks) >= self.capacity:
+        self.evict()
+      chunk = chunks[key] = self.store.load(key, self.size)
+      self.loads += 1
+    else:
+      chunks.move_to_end(key)
+      self.hits += 1
+    self.last_key = key
+    self.last = chunk
+    return chunk
+
+  def evict(self):
+    key, chunk = self.chunks.popitem(last=False)
+    if chunk.dirty:
+      self.store.save(key, chunk)
+    if key == self.last_key:
+      self.last_key = self.last = None
+    self.evictions += 1
+
+  def flush(self):
+    """ save every edited chunk """
+    for key, chunk in self.chunks.items():
+      if chunk.dirty:
+        self.store.save(key, chunk)
+        chunk.dirty = False
+
+  def locate(self, cp):
+    """ chunk holding cp and the index of cp in it """
+    r, c = cp
+    size = self.size
+    chunk = self.chunk((r // size, c // size))
+    return chunk, (r % size) * size + c % size
+
+  def watch(self, func):
+    """ call func(cp) after every wall or weight change at cp """
+    self.watchers.append(func)
+
+  def unwatch(self, func):
+    self.watchers.remove(func)
+
+  def changed(self, cp):
+    self.version += 1
+    for func in self.watchers:
+      func(cp)
+
+  def in_bounds(self, cp):
+    return True
+
+  def is_wall(self, cp):
+    chunk, k = self.locate(cp)
+    return chunk.cells[k] == 1
+
+  def passable(self, cp):
+    chunk, k = self.locate(cp)
+    return not chunk.cells[k]
+
+  def add_wall(self, cp):
+    chunk, k = self.locate(cp)
+    if not chunk.cells[k]:
+      chunk.cells[k] = 1
+      chunk.dirty = True
+      self.changed(cp)
+
+  def remove_wall(self, cp):
+    chunk, k = self.locate(cp)
+    if chunk.cells[k]:
+      chunk.cells[k] = 0
+      chunk.dirty = True
+      self.changed(cp)
+
+  def toggle_wall(self, cp):
+    if self.is_wall(cp):
+      self.remove_wall(cp)
+    else:
+      self.add_wall(cp)
+
+  def set_weight(self, cp, w):
+    chunk, k = self.locate(cp)
+    if chunk.weight is None:
+      if w == 1:
+        return
+      chunk.weight = array('H', [1]) * (self.size * self.size)
+    if chunk.weight[k] != w:
+      chunk.weight[k] = w
+      chunk.dirty = True
+      self.changed(cp)
+
+  def cost(self, a, b):
+    """ cost from a to b """
+    chunk, k = self.locate(b)
+    if chunk.weight is None:
+      return 1
+    return chunk.weight[k]
+
+  def neighbors(self, cp):
+    """ open cells next to cp, in the same order as Grid.neighbors """
+    r, c = cp
+    steps = [(r + 1, c), (r - 1, c), (r, c - 1), (r, c + 1)]
+    if (r + c) % 2 == 0:
+      steps.reverse()
+    return [np for np in steps if self.passable(np)]
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ long queries through a world far bigger than the resident set """
+  world = ChunkedGrid(MemoryStore(random_fill(0.2, seed=1)), size=32, capacity=16)
+  world.remove_wall((0, 0))
+  for goal in ((200, 200), (-800, 500), (600, -600)):
+    world.remove_wall(goal)
+    world.reset_stats()
+    t0 = time.perf_counter()
+    path = astar_search(world, (0, 0), goal)
+    dt = time.perf_counter() - t0
+    print(f"(0, 0) -> {goal}: len={len(path)} {dt*1e3:.0f} ms {world.stats()}")
+  path = os.path.join(tempfile.gettempdir(), 'chunks')
+  world = ChunkedGrid(DirStore(path, random_fill(0.2, seed=1)), capacity=4)
+  world.add_wall((5, 5))
+  for i in range(8):
+    world.passable((i * 64, 0))  # push the edited chunk out
+  print(f"saved chunk reloads with wall: {world.is_wall((5, 5))}")
+  for name in os.listdir(path):
+    os.remove(os.path.join(path, name))
+  os.rmdir(path)
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  test1()
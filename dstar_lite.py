@@ -0,0 +1,173 @@
+# D* Lite incremental replanning
+
+"""
+D* Lite (Koenig and Likhachev) searches backwards from the goal and
+keeps its g/rhs values between plans.  The planner watches its grid,
+so walls toggled or weights changed through Grid are queued and only
+the vertices around them are repaired on the next plan.  Moving the
+start (the robot took a step) just bumps the key modifier km.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from pqueue import IndexedPQueue
+from grid_search import astar_search, heuristic
+import uGrid
+
+
+INF = float('inf')
+
+
+class DStarLite:
+  """ Incremental planner for one goal on a grid """
+
+  def __init__(self, graph, start, goal):
+    self.graph = graph
+    self.start = start
+    self.last = start
+    self.goal = goal
+    self.km = 0
+    self.g = {}
+    self.rhs = {goal: 0}
+    self.front = IndexedPQueue()
+    self.front.put(goal, self.key(goal))
+    self.pending = []
+    self.expanded = 0
+    graph.watch(self.notify)
+
+  def close(self):
+    """ stop watching the grid """
+    self.graph.unwatch(self.notify)
+
+  def notify(self, cp):
+    self.pending.append(cp)
+
+  def key(self, s):
+    m = min(self.g.get(s, INF), self.rhs.get(s, INF))
+    return (m + heuristic(self.start, s) + self.km, m)
+
+  def succ(self, s):
+    return self.graph.neighbors(s)
+
+  def pred(self, s):
+    """ every in-bounds cell next to s, walls too: a wall cell still
+        steps out to its open neighbors, so it can be a predecessor
+    """
+    r, c = s
+    return [np for np in ((r + 1, c), (r - 1, c), (r, c - 1), (r, c + 1))
+            if self.graph.in_bounds(np)]
+
+  def update_vertex(self, s):
+    graph, g = self.graph, self.g
+    if s != self.goal:
+      self.rhs[s] = min((graph.cost(s, np) + g.get(np, INF)
+                         for np in self.succ(s)), default=INF)
+    if self.front.contains(s):
+      self.front.remove(s)
+    if g.get(s, INF) != self.rhs.get(s, INF):
+      self.front.put(s, self.key(s))
+
+  def move_start(self, start):
+    """ the agent moved to start """
+    self.km += heuristic(self.last, start)
+    self.last = start
+    self.start = start
+
+  def apply_changes(self):
+    """ repair the vertices around queued cell changes """
+    graph = self.graph
+    changed = set(self.pending)
+    self.pending = []
+    dirty = set()
+    for cp in changed:
+      if not graph.in_bounds(cp):
+        continue
+      dirty.add(cp)
+      r, c = cp
+      for np in ((r + 1, c), (r - 1, c), (r, c - 1), (r, c + 1)):
+        if graph.in_bounds(np):
+          dirty.add(np)
+    for s in dirty:
+      self.update_vertex(s)
+
+  def compute(self):
+    front, g, rhs, start = self.front, self.g, self.rhs, self.start
+    while not front.empty() and (front.top() < self.key(start) or
+                                 rhs.get(start, INF) != g.get(start, INF)):
+      u = front.peek()
+      k_old = front.top()
+      k_new = self.key(u)
+      self.expanded += 1
+      if k_old < k_new:
+        front.put(u, k_new)
+      elif g.get(u, INF) > rhs.get(u, INF):
+        g[u] = rhs[u]
+        front.remove(u)
+        for s in self.pred(u):
+          self.update_vertex(s)
+      else:
+        g[u] = INF
+        self.update_vertex(u)
+        for s in self.pred(u):
+          self.update_vertex(s)
+
+  def plan(self):
+    """ path from start to goal, repairing only what changed """
+    self.apply_changes()
+    self.compute()
+    graph, g = self.graph, self.g
+    if g.get(self.start, INF) == INF:
+      return []
+    path = [self.start]
+    cp = self.start
+    limit = graph.rows * graph.cols
+    while cp != self.goal:
+      steps = [np for np in self.succ(cp) if g.get(np, INF) < INF]
+      if not steps:
+        return []
+      cp = min(steps, key=lambda np: graph.cost(cp, np) + g.get(np, INF))
+      path.append(cp)
+      if len(path) > limit:
+        return []
+    return path
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ replan after wall toggles vs astar from scratch """
+  grid, start, goal = uGrid.rand_grid(80, 80, 1500)
+  planner = DStarLite(grid, start, goal)
+  path = planner.plan()
+  print(f"first plan len={len(path)} expanded={planner.expanded}")
+  for i in range(5):
+    cp = path[len(path) // 2] if len(path) > 2 else uGrid.rand_open(grid)
+    grid.toggle_wall(cp)
+    planner.expanded = 0
+    path = planner.plan()
+    print(f"toggle {cp}: len={len(path)} expanded={planner.expanded} "
+          f"astar len={len(astar_search(grid, start, goal))}")
+  planner.close()
+
+
+def test2():
+  """ start on a wall: it can still step off onto an open neighbor """
+  grid = uGrid.Grid(2, 2)
+  grid.add_wall((0, 1))
+  planner = DStarLite(grid, (0, 1), (1, 1))
+  print(f"start on wall: {planner.plan()} "
+        f"astar {astar_search(grid, (0, 1), (1, 1))}")
+  grid.add_wall((0, 0))
+  grid.add_wall((1, 1))
+  print(f"walled in: {planner.plan()}")
+  planner.close()
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  test1()
+  test2()
@@ -0,0 +1,209 @@
+# Flow field towards a single goal
+
+"""
+One reverse dijkstra_map from the goal gives every cell its cost to the
+goal and the step to take next.  Both are stored per cell in flat
+arrays (cost as int64, -1 = cannot reach; step as an index into
+uGrid.STEPS, NONE at the goal), so any number of agents can read their
+next move in O(1).  An agent standing on a wall cell steps off it to the
+neighbour that is cheapest from there, as astar_search would.
+
+The field watches its grid.  After a change at a cell, the cells whose
+route ran through it are reset.  They are seeded again from their
+settled neighbours, and a small Dijkstra spreads from there.  That same
+Dijkstra carries any improvement outwards when the change opened a
+cheaper route.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from array import array
+from heapq import heappush, heappop
+import time
+from grid_search import astar_search, dijkstra_map
+from path_cache import path_cost
+import uGrid
+
+
+NONE = 255
+INF = float('inf')
+STEPS = uGrid.STEPS
+
+
+class FlowField:
+  """ Cost to goal and next step for every cell of a grid """
+
+  def __init__(self, graph, goal):
+    self.graph = graph
+    self.goal = goal
+    n = graph.rows * graph.cols
+    self.dist = array('q', [-1]) * n
+    self.step = bytearray([NONE]) * n
+    self.build()
+    graph.watch(self.repair)
+
+  def close(self):
+    """ stop watching the grid """
+    self.graph.unwatch(self.repair)
+
+  def build(self):
+    """ fill the field from one reverse search """
+    graph, dist, step = self.graph, self.dist, self.step
+    for k in range(len(dist)):
+      dist[k] = -1
+      step[k] = NONE
+    if not graph.passable(self.goal):
+      return
+    came_from, cost_so_far = dijkstra_map(graph, self.goal, reverse=True)
+    for cp, d in cost_so_far.items():
+      k = graph.index(cp)
+      dist[k] = d
+      nxt = came_from[cp]
+      if nxt is not None:
+        step[k] = STEPS.index((nxt[0] - cp[0], nxt[1] - cp[1]))
+
+  def way_out(self, cp):
+    """ (cost, cell) of the best step off wall cell cp, None if no
+        open neighbour reaches the goal
+    """
+    graph, dist = self.graph, self.dist
+    best = None
+    for n in graph.neighbors(cp):
+      d = dist[graph.index(n)]
+      if d >= 0:
+        d += graph.cost(cp, n)
+        if best is None or d < best[0]:
+          best = (d, n)
+    return best
+
+  def distance(self, cp):
+    """ cost from cp to the goal, None if it can't get there """
+    if not self.graph.passable(cp):
+      out = self.way_out(cp)
+      return None if out is None else out[0]
+    d = self.dist[self.graph.index(cp)]
+    return None if d < 0 else d
+
+  def next_step(self, cp):
+    """ the cell to move to from cp, None at the goal or when stuck """
+    if not self.graph.passable(cp):
+      out = self.way_out(cp)
+      return None if out is None else out[1]
+    return self.parent(cp)
+
+  def path(self, cp):
+    """ follow the field from cp, in the form make_path returns """
+    if self.distance(cp) is None:
+      return []
+    path = [cp]
+    while cp != self.goal:
+      cp = self.next_step(cp)
+      path.append(cp)
+    return path
+
+  def parent(self, cp):
+    """ the next cell stored for cp, None if there is none """
+    s = self.step[self.graph.index(cp)]
+    if s == NONE:
+      return None
+    dr, dc = STEPS[s]
+    return cp[0] + dr, cp[1] + dc
+
+  def subtree(self, cp):
+    """ cp and every cell whose route runs through it """
+    graph, step = self.graph, self.step
+    found = [cp]
+    seen = {cp}
+    for y in found:
+      for dr, dc in STEPS:
+        z = (y[0] + dr, y[1] + dc)
+        if z not in seen and graph.in_bounds(z) and self.parent(z) == y:
+          seen.add(z)
+          found.append(z)
+    return found
+
+  def repair(self, cp):
+    """ grid watcher: patch the field after a change at cp """
+    graph, dist, step = self.graph, self.dist, self.step
+    if not graph.in_bounds(cp):
+      return
+    if cp == self.goal:
+      self.build()
+      return
+    reset = self.subtree(cp)
+    for y in reset:
+      k = graph.index(y)
+      dist[k] = -1
+      step[k] = NONE
+    front = []
+    for y in reset:
+      if not graph.passable(y):
+        continue
+      k = graph.index(y)
+      for n in graph.neighbors(y):
+        d = dist[graph.index(n)]
+        if d >= 0 and (dist[k] < 0 or d + graph.cost(y, n) < dist[k]):
+          dist[k] = d + graph.cost(y, n)
+          step[k] = STEPS.index((n[0] - y[0], n[1] - y[1]))
+      if dist[k] >= 0:
+        heappush(front, (dist[k], y))
+    while front:
+      d, y = heappop(front)
+      if d > dist[graph.index(y)]:
+        continue
+      for z in graph.neighbors(y):
+        k = graph.index(z)
+        new_cost = d + graph.cost(z, y)
+        if dist[k] < 0 or new_cost < dist[k]:
+          dist[k] = new_cost
+          step[k] = STEPS.index((y[0] - z[0], y[1] - z[1]))
+          heappush(front, (new_cost, z))
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ many agents to one goal: astar each vs one flow field """
+  grid, start, goal = uGrid.rand_grid(120, 120, 3000)
+  agents = [uGrid.rand_open(grid) for i in range(200)]
+  t0 = time.perf_counter()
+  for a in agents:
+    astar_search(grid, a, goal)
+  t1 = time.perf_counter()
+  field = FlowField(grid, goal)
+  for a in agents:
+    field.path(a)
+  t2 = time.perf_counter()
+  print(f"{len(agents)} agents: astar {(t1-t0)*1e3:.0f} ms, "
+        f"flow field {(t2-t1)*1e3:.0f} ms")
+  cp = field.path(agents[0])[1:2] or [uGrid.rand_open(grid)]
+  t0 = time.perf_counter()
+  grid.toggle_wall(cp[0])
+  print(f"repair after toggle_wall {cp[0]}: {(time.perf_counter()-t0)*1e3:.2f} ms")
+  field.close()
+
+
+def test2():
+  """ agents standing on walls step off them like astar_search """
+  grid, start, goal = uGrid.rand_grid(40, 40, 500)
+  field = FlowField(grid, goal)
+  walls = [cp for cp in grid.walls if grid.in_bounds(cp)][:200]
+  same = 0
+  for cp in walls:
+    d = field.distance(cp)
+    path = field.path(cp)
+    best = path_cost(grid, astar_search(grid, cp, goal))
+    if path_cost(grid, path) == best and (d is None) == (best == INF):
+      same += 1
+  print(f"{same} of {len(walls)} wall starts match astar_search")
+  field.close()
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  test1()
+  test2()
@@ -0,0 +1,243 @@
+# Memory-mapped binary grid files
+
+"""
+A compact file for a Grid that is opened with mmap instead of parsed,
+so a process can serve queries as soon as the file is open, and every
+worker that maps the same file shares one copy in the page cache.
+
+  header   16 bytes: magic, rows, cols, flags (1 = weight plane)
+  walls    one bit per cell, cell k is bit k & 7 of byte k >> 3
+  weights  rows * cols uint16 in native byte order, 8-byte aligned
+
+MappedGrid is a Grid whose passable/neighbors test the wall bits in the
+mapped file and whose cost reads the weight plane in place.  Its cells
+is a BitCells view, so code that indexes grid.cells still works.
+Opened writable, wall and weight edits go straight to the file.  The
+file can't grow a weight plane, so a grid saved without weights raises
+ValueError on set_weight with any weight but 1.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from array import array
+import mmap
+import os
+import struct
+import tempfile
+import time
+from grid_search import astar_search
+import uGrid
+
+
+MAGIC = b'GRD1'
+HEADER = struct.Struct('<4siii')  # magic, rows, cols, flags
+HAS_WEIGHT = 1
+
+# byte -> its bits spread over 8 bytes, and back
+BIT_OF = [bytes((v >> j) & 1 for v in range(256)) for j in range(8)]
+BIT_TO = [bytes(1 << j if v else 0 for v in range(256)) for j in range(8)]
+
+
+def pack_bits(cells):
+  """ 0/1 bytes -> bit per cell """
+  n = len(cells)
+  cells = bytes(cells) + bytes(-n % 8)
+  packed = 0
+  for j in range(8):
+    packed |= int.from_bytes(cells[j::8].translate(BIT_TO[j]), 'little')
+  return packed.to_bytes(len(cells) // 8, 'little')
+
+
+def unpack_bits(bits, n):
+  """ bit per cell -> 0/1 bytes """
+  bits = bytes(bits)
+  cells = bytearray(len(bits) * 8)
+  for j in range(8):
+    cells[j::8] = bits.translate(BIT_OF[j])
+  return cells[:n]
+
+
+def layout(rows, cols):
+  """ offsets of the wall bits and weight plane """
+  n = rows * cols
+  walls = HEADER.size
+  weights = walls + ((n + 7) // 8 + 7) // 8 * 8
+  return walls, weights
+
+
+def save_grid(grid, filename):
+  """ write grid in the binary format """
+  rows, cols = grid.rows, grid.cols
+  walls, weights = layout(rows, cols)
+  flags = HAS_WEIGHT if grid.weight is not None else 0
+  bits = pack_bits(grid.cells)
+  with open(filename, 'wb') as f:
+    f.write(HEADER.pack(MAGIC, rows, cols, flags))
+    f.write(bits)
+    f.write(bytes(weights - walls - len(bits)))
+    if flags & HAS_WEIGHT:
+      f.write(array('H', grid.weight).tobytes())
+
+
+def read_header(buf, filename):
+  magic, rows, cols, flags = HEADER.unpack_from(buf)
+  if magic != MAGIC:
+    raise ValueError(f'{filename} is not a grid file')
+  return rows, cols, flags
+
+
+def load_grid(filename):
+  """ read a grid file into an ordinary in-memory Grid """
+  with open(filename, 'rb') as f:
+    data = f.read()
+  rows, cols, flags = read_header(data, filename)
+  walls, weights = layout(rows, cols)
+  n = rows * cols
+  cells = unpack_bits(data[walls:weights], n)
+  weight = None
+  if flags & HAS_WEIGHT:
+    weight = array('H')
+    weight.frombytes(data[weights:weights + 2 * n])
+  return uGrid.Grid.from_buffer(rows, cols, cells, weight)
+
+
+class BitCells:
+  """ Wall bits seen as a sequence of 0/1 like Grid.cells """
+
+  def __init__(self, bits, n):
+    self.bits = bits
+    self.n = n
+
+  def __len__(self):
+    return self.n
+
+  def __getitem__(self, k):
+    if isinstance(k, slice):
+      return bytes(self)[k]
+    if k < 0:
+      k += self.n
+    if not 0 <= k < self.n:
+      raise IndexError(k)
+    return self.bits[k >> 3] >> (k & 7) & 1
+
+  def __setitem__(self, k, v):
+    if v:
+      self.bits[k >> 3] |= 1 << (k & 7)
+    else:
+      self.bits[k >> 3] &= ~(1 << (k & 7)) & 255
+
+  def __bytes__(self):
+    return bytes(unpack_bits(self.bits, self.n))
+
+  def __iter__(self):
+    return iter(bytes(self))
+
+
+class MappedGrid(uGrid.Grid):
+  """ Grid backed by a memory-mapped grid file """
+
+  def __init__(self, filename, writable=False):
+    super().__init__(0, 0)
+    self.file = open(filename, 'r+b' if writable else 'rb')
+    access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+    self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+    rows, cols, flags = read_header(self.map, filename)
+    walls, weights = layout(rows, cols)
+    n = rows * cols
+    self.rows = rows
+    self.cols = cols
+    self.view = memoryview(self.map)
+    self.bits = self.view[walls:walls + (n + 7) // 8]
+    self.cells = BitCells(self.bits, n)
+    if flags & HAS_WEIGHT:
+      self.weight = self.view[weights:weights + 2 * n].cast('H')
+    self._nwalls = None  # counted on first use
+
+  @property
+  def nwalls(self):
+    if self._nwalls is None:
+      self._nwalls = bin(int.from_bytes(self.bits, 'little')).count('1')
+    return self._nwalls
+
+  @nwalls.setter
+  def nwalls(self, n):
+    self._nwalls = n
+
+  def close(self):
+    """ release the mapping; the grid can't be used afterwards """
+    if self.weight is not None:
+      self.weight.release()
+      self.weight = None
+    self.bits.release()
+    self.view.release()
+    self.map.close()
+    self.file.close()
+
+  def set_weight(self, cp, w):
+    """ set the cost of stepping into cp in the file's weight plane """
+    if self.weight is None and w != 1:
+      raise ValueError('grid file has no weight plane; save it from a '
+                       'grid with weights')
+    super().set_weight(cp, w)
+
+  def is_wall(self, cp):
+    return self.in_bounds(cp) and not self.passable(cp)
+
+  def passable(self, cp):
+    r, c = cp
+    if 0 <= r < self.rows and 0 <= c < self.cols:
+      k = r * self.cols + c
+      return not self.bits[k >> 3] >> (k & 7) & 1
+    return True
+
+  def neighbors(self, cp):
+    if self.nbr is not None:
+      return super().neighbors(cp)
+    r, c = cp
+    rows, cols, bits = self.rows, self.cols, self.bits
+    steps = [(r + 1, c), (r - 1, c), (r, c - 1), (r, c + 1)]
+    if (r + c) % 2 == 0:
+      steps.reverse()
+    found = []
+    for i, j in steps:
+      if 0 <= i < rows and 0 <= j < cols:
+        k = i * cols + j
+        if not bits[k >> 3] >> (k & 7) & 1:
+          found.append((i, j))
+    return found
+
+
+def open_grid(filename, writable=False):
+  return MappedGrid(filename, writable)
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ save a large grid, then time opening it vs loading it """
+  grid, start, goal = uGrid.rand_grid(2000, 2000, 1200000)
+  filename = os.path.join(tempfile.gettempdir(), 'grid.grd')
+  save_grid(grid, filename)
+  print(f"{grid.rows}x{grid.cols}: {os.path.getsize(filename)/1e6:.1f} MB on disk")
+  t0 = time.perf_counter()
+  mapped = open_grid(filename)
+  t1 = time.perf_counter()
+  loaded = load_grid(filename)
+  t2 = time.perf_counter()
+  print(f"open_grid {(t1-t0)*1e3:.2f} ms | load_grid {(t2-t1)*1e3:.1f} ms")
+  for g in (grid, loaded, mapped):
+    t0 = time.perf_counter()
+    path = astar_search(g, start, goal)
+    print(f"{type(g).__name__:10s} astar len={len(path)} "
+          f"{(time.perf_counter()-t0)*1e3:.1f} ms")
+  mapped.close()
+  os.remove(filename)
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  test1()
@@ -4,70 +4,129 @@ __author__ = 'Bruce Wernick'
 __date__ = '29 August 2021'
 
 
-from collections import deque
-from pqueue import PQueue
+from collections import OrderedDict, deque
+from multiprocessing import shared_memory
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+from pqueue import PQueue, IndexedPQueue, BucketQueue
 import uGrid
 
 
-def find_path(graph, a_node, b_node, search_path=None):
-  """ recursive path find (by Guido van Rossum) """
+INF = float('inf')
 
-  if search_path:
-    path = search_path + [a_node]
-  else:
-    path = [a_node]
 
-  # check if we have reached the b_node
+def find_path(graph, a_node, b_node, search_path=None):
+  """ Depth first path find (after Guido van Rossum's recursive one).
+      A cell that has been left once is never entered again, so this is
+      linear in the size of the grid.
+  """
+  path = (search_path or []) + [a_node]
   if a_node == b_node:
     return path
-
-  for np in graph.neighbors(a_node):
-    if np not in path:
-      new_path = find_path(graph, np, b_node, path)
-      if new_path:
-        return new_path
-
+  seen = set(path)
+  stack = [iter(graph.neighbors(a_node))]
+  while stack:
+    np = next(stack[-1], None)
+    if np is None:
+      stack.pop()
+      path.pop()
+      continue
+    if np in seen:
+      continue
+    seen.add(np)
+    path.append(np)
+    if np == b_node:
+      return path
+    stack.append(iter(graph.neighbors(np)))
   return None
 
 
-def find_all_paths(graph, a_node, b_node, search_path=None):
-
-  if search_path:
-    path = search_path + [a_node]
-  else:
-    path = [a_node]
-
+def iter_all_paths(graph, a_node, b_node, search_path=None, limit=None):
+  """ Yield every simple path from a_node to b_node, depth first, at
+      most limit of them.  An explicit stack of neighbor iterators
+      replaces the recursion and a set gives O(1) on-path tests.
+  """
+  path = (search_path or []) + [a_node]
   if a_node == b_node:
-    return [path]
+    yield path
+    return
+  on_path = set(path)
+  stack = [iter(graph.neighbors(a_node))]
+  count = 0
+  while stack:
+    np = next(stack[-1], None)
+    if np is None:
+      stack.pop()
+      on_path.discard(path.pop())
+      continue
+    if np in on_path:
+      continue
+    if np == b_node:
+      yield path + [np]
+      count += 1
+      if limit is not None and count >= limit:
+        return
+      continue
+    path.append(np)
+    on_path.add(np)
+    stack.append(iter(graph.neighbors(np)))
 
-  paths = []
-  for np in graph.neighbors(a_node):
-    if np not in path:
-      new_paths = find_all_paths(graph, np, b_node, path)
-      for new_path in new_paths:
-        paths.append(new_path)
 
-  return paths
+def find_all_paths(graph, a_node, b_node, search_path=None, limit=None):
+  return list(iter_all_paths(graph, a_node, b_node, search_path, limit))
 
 
-def find_shortest_path(graph, a_node, b_node, search_path=None):
-
-  if search_path:
-    path = search_path + [a_node]
-  else:
-    path = [a_node]
-
+def find_shortest_path(graph, a_node, b_node, search_path=None, stats=None):
+  """ Depth first, but a branch is dropped once it can't beat the best
+      path so far (its length plus the Manhattan distance left), or when
+      it reaches a cell no shallower than an earlier branch did.
+      Neighbors nearest the goal are tried first so a short path turns
+      up early.
+  """
+  if stats:
+    stats.start()
+  path = (search_path or []) + [a_node]
   if a_node == b_node:
-    return path
+    return stats.finish('search', path) if stats else path
+  on_path = set(path)
+  depth = {a_node: len(path)}
 
-  shortest = None
-  for np in graph.neighbors(a_node):
-    if np not in path:
-      new_path = find_shortest_path(graph, np, b_node, path)
-      if new_path:
-        if not shortest or len(new_path) < len(shortest):
-          shortest = new_path
+  def toward(cp):
+    nbrs = graph.neighbors(cp)
+    if stats:
+      stats.expand(cp, nbrs)
+    return iter(sorted(nbrs, key=lambda np: heuristic(np, b_node)))
 
+  if stats:
+    stats.push(a_node, 1)
+  stack = [toward(a_node)]
+  shortest = None
+  while stack:
+    np = next(stack[-1], None)
+    if np is None:
+      stack.pop()
+      on_path.discard(path.pop())
+      continue
+    d = len(path) + 1
+    if np in on_path or depth.get(np, INF) <= d:
+      continue
+    if shortest and d + heuristic(np, b_node) >= len(shortest):
+      continue
+    depth[np] = d
+    if np == b_node:
+      shortest = path + [np]
+      continue
+    path.append(np)
+    on_path.add(np)
+    if stats:
+      stats.push(np, len(path))
+    stack.append(toward(np))
+  if stats:
+    stats.finish('search', shortest, None, depth, on_path)
   return shortest
 
 
@@ -96,21 +155,133 @@ def shortest_path(graph, a_node, b_node):
   return flatten(came_from.get(b_node))
 
 
-def fsp(graph, a_node, b_node):
+def fsp(graph, a_node, b_node, stats=None):
   """ Simplified Kopczynski code (actually, it turns out
       to be pretty much the same as Patel's Depth First
       Search), except for the early exit.
   """
+  if stats:
+    stats.start()
   front = deque()
   front.append(a_node)
   came_from = {a_node: None}
+  if stats:
+    stats.push(a_node, 1)
   while front:
     cp = front.popleft()
-    for np in graph.neighbors(cp):
+    nbrs = graph.neighbors(cp)
+    if stats:
+      stats.expand(cp, nbrs)
+    for np in nbrs:
       if np not in came_from:
         front.append(np)
         came_from[np] = cp
-  return make_path(came_from, a_node, b_node)
+        if stats:
+          stats.push(np, len(front))
+  if stats:
+    stats.lap('search')
+  path = make_path(came_from, a_node, b_node)
+  if stats:
+    stats.finish('path', path, front, came_from)
+  return path
+
+
+# ---------------------------------------------------------------------
+
+# Search statistics
+
+def deep_size(objs):
+  """ bytes held by objs and everything in them (dict keys and values,
+      list, tuple, set and deque items), each object counted once
+  """
+  seen = set()
+  total = 0
+  todo = list(objs)
+  while todo:
+    x = todo.pop()
+    if id(x) in seen:
+      continue
+    seen.add(id(x))
+    total += sys.getsizeof(x)
+    if isinstance(x, dict):
+      todo.extend(x.keys())
+      todo.extend(x.values())
+    elif isinstance(x, (list, tuple, set, frozenset, deque)):
+      todo.extend(x)
+  return total
+
+
+class SearchStats:
+  """ What one search did.  Pass an instance as stats= to any search in
+      this module and read it back afterwards.  observer(event, cp) is
+      called for every 'expand' and 'push', e.g. to feed a metrics
+      system.
+
+      peak_bytes is the size of the search's tables (came_from,
+      cost_so_far, caches) with the keys and values they hold, when the
+      search ends; that is their peak, as they only grow.  It is
+      measured on first read, so the tables are kept until then.  times
+      holds seconds per phase: 'check' (component index), 'search' and
+      'path' (make_path).
+  """
+
+  def __init__(self, observer=None):
+    self.observer = observer
+    self.path = []
+    self.expanded = 0
+    self.generated = 0
+    self.pushes = 0
+    self.stale_pops = 0
+    self.peak_frontier = 0
+    self.tables = ()
+    self.nbytes = 0
+    self.times = {}
+    self.t0 = 0.0
+
+  def start(self):
+    self.t0 = time.perf_counter()
+
+  def lap(self, phase):
+    """ charge the time since the last lap to phase """
+    t = time.perf_counter()
+    self.times[phase] = self.times.get(phase, 0.0) + t - self.t0
+    self.t0 = t
+
+  def expand(self, cp, nbrs):
+    self.expanded += 1
+    self.generated += len(nbrs)
+    if self.observer:
+      self.observer('expand', cp)
+
+  def push(self, cp, size):
+    """ cp was queued, leaving size items in the frontier """
+    self.pushes += 1
+    if size > self.peak_frontier:
+      self.peak_frontier = size
+    if self.observer:
+      self.observer('push', cp)
+
+  def finish(self, phase, path, front=None, *tables):
+    self.lap(phase)
+    self.path = path or []
+    self.stale_pops = getattr(front, 'stale_pops', 0)
+    self.tables = tables
+    self.nbytes = None
+    return path
+
+  @property
+  def peak_bytes(self):
+    if self.nbytes is None:
+      self.nbytes = deep_size(self.tables)
+      self.tables = ()
+    return self.nbytes
+
+  def summary(self):
+    return {'expanded': self.expanded, 'generated': self.generated,
+            'pushes': self.pushes, 'stale_pops': self.stale_pops,
+            'peak_frontier': self.peak_frontier,
+            'peak_bytes': self.peak_bytes, 'times': dict(self.times),
+            'length': len(self.path)}
 
 
 # ---------------------------------------------------------------------
@@ -132,40 +303,108 @@ def make_path(came_from, start, goal):
   return path
 
 
-def bfs_search(graph, a_node, b_node):
+def reachable(graph, a_node, b_node):
+  """ False when the grid's component index rules out any path """
+  index = getattr(graph, 'components', None)
+  return index is None or index.connected(a_node, b_node)
+
+
+def bfs_search(graph, a_node, b_node, stats=None):
   """ Iterative path find based on breadth first search """
+  if stats:
+    stats.start()
+  if not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
   front = deque()
   front.append(a_node)
   came_from = {a_node: None}
+  if stats:
+    stats.push(a_node, 1)
   while front:
     cp = front.popleft()
     if cp == b_node:
       break  # early exit
-    for np in graph.neighbors(cp):
+    nbrs = graph.neighbors(cp)
+    if stats:
+      stats.expand(cp, nbrs)
+    for np in nbrs:
       if np not in came_from:
         front.append(np)
         came_from[np] = cp
-  return make_path(came_from, a_node, b_node)
+        if stats:
+          stats.push(np, len(front))
+  if stats:
+    stats.lap('search')
+  path = make_path(came_from, a_node, b_node)
+  if stats:
+    stats.finish('path', path, front, came_from)
+  return path
 
 
-def dijkstra_search(graph, a_node, b_node):
-  """ Dijkstra Search """
-  front = PQueue()
+def dijkstra_search(graph, a_node, b_node, queue=PQueue, stats=None):
+  """ Dijkstra Search.  queue is the priority queue factory,
+      e.g. PQueue, IndexedPQueue or BucketQueue.  stats is an optional
+      SearchStats to fill in.
+  """
+  if stats:
+    stats.start()
+  if not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
+  front = queue()
   front.put(a_node, 0)
   came_from = {a_node: None}
   cost_so_far = {a_node: 0}
+  if stats:
+    stats.push(a_node, 1)
   while not front.empty():
     cp = front.get()
     if cp == b_node:
       break
-    for np in graph.neighbors(cp):
+    nbrs = graph.neighbors(cp)
+    if stats:
+      stats.expand(cp, nbrs)
+    for np in nbrs:
       new_cost = cost_so_far.get(cp) + graph.cost(cp, np)
       if np not in cost_so_far or new_cost < cost_so_far[np]:
         cost_so_far[np] = new_cost
         k = new_cost
         front.put(np, k)
         came_from[np] = cp
-  return make_path(came_from, a_node, b_node)
+        if stats:
+          stats.push(np, len(front))
+  if stats:
+    stats.lap('search')
+  path = make_path(came_from, a_node, b_node)
+  if stats:
+    stats.finish('path', path, front, came_from, cost_so_far)
+  return path
+
+
+def dijkstra_map(graph, a_node, reverse=False):
+  """ Dijkstra from a_node to every reachable node.  With reverse the
+      costs are measured towards a_node instead of away from it.
+      Returns came_from and cost_so_far.
+  """
+  front = PQueue()
+  front.put(a_node, 0)
+  came_from = {a_node: None}
+  cost_so_far = {a_node: 0}
+  while not front.empty():
+    cp = front.get()
+    for np in graph.neighbors(cp):
+      if reverse:
+        new_cost = cost_so_far[cp] + graph.cost(np, cp)
+      else:
+        new_cost = cost_so_far[cp] + graph.cost(cp, np)
+      if np not in cost_so_far or new_cost < cost_so_far[np]:
+        cost_so_far[np] = new_cost
+        front.put(np, new_cost)
+        came_from[np] = cp
+  return came_from, cost_so_far
 
 
 def heuristic(a, b):
@@ -174,24 +413,766 @@ def heuristic(a, b):
   return abs(x1 - x2) + abs(y1 - y2)
 
 
-def astar_search(graph, a_node, b_node):
-  """ AStar search """
-  front = PQueue()
+def astar_search(graph, a_node, b_node, queue=PQueue, heuristic=heuristic,
+                 stats=None):
+  """ AStar search, queue and stats as for dijkstra_search.
+      heuristic(a, b) must not overestimate the cost from a to b,
+      e.g. Landmarks.heuristic.
+  """
+  if stats:
+    stats.start()
+  if not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
+  front = queue()
   front.put(a_node, 0)
   came_from = {a_node: None}
   cost_so_far = {a_node: 0}
+  if stats:
+    stats.push(a_node, 1)
   while not front.empty():
     cp = front.get()
     if cp == b_node:
       break
-    for np in graph.neighbors(cp):
+    nbrs = graph.neighbors(cp)
+    if stats:
+      stats.expand(cp, nbrs)
+    for np in nbrs:
       new_cost = cost_so_far.get(cp) + graph.cost(cp, np)
       if np not in cost_so_far or new_cost < cost_so_far[np]:
         cost_so_far[np] = new_cost
         k = new_cost + heuristic(np, b_node)
         front.put(np, k)
         came_from[np] = cp
-  return make_path(came_from, a_node, b_node)
+        if stats:
+          stats.push(np, len(front))
+  if stats:
+    stats.lap('search')
+  path = make_path(came_from, a_node, b_node)
+  if stats:
+    stats.finish('path', path, front, came_from, cost_so_far)
+  return path
+
+
+# ---------------------------------------------------------------------
+
+# Memory-bounded searches.  table_size caps the cells whose g they
+# remember.  Without full tables a pass can't tell that b_node is cut off,
+# so they also keep a flag byte per cell (a dict on graphs without rows
+# and cols) and stop once a pass has nothing left to reach.
+
+REACHED = 1
+PRUNED = 2
+
+
+class CellFlags:
+  """ A few flag bits per cell """
+
+  def __init__(self, graph):
+    self.cols = getattr(graph, 'cols', None)
+    rows = getattr(graph, 'rows', None)
+    if rows is None or self.cols is None:
+      self.cols = None
+      self.flags = {}
+    else:
+      self.flags = bytearray(rows * self.cols)
+
+  def get(self, cp):
+    if self.cols is None:
+      return self.flags.get(cp, 0)
+    return self.flags[cp[0] * self.cols + cp[1]]
+
+  def set(self, cp, bit):
+    if self.cols is None:
+      self.flags[cp] = self.flags.get(cp, 0) | bit
+    else:
+      self.flags[cp[0] * self.cols + cp[1]] |= bit
+
+  def has(self, value):
+    """ True if some cell's flags are exactly value """
+    return value in (self.flags.values() if self.cols is None else self.flags)
+
+
+def fringe_path(entry):
+  """ path to the cell of a fringe entry (cp, g, parent entry) """
+  path = []
+  while entry is not None:
+    path.append(entry[0])
+    entry = entry[2]
+  path.reverse()
+  return path
+
+
+def fringe_search(graph, a_node, b_node, heuristic=heuristic, table_size=None,
+                  stats=None):
+  """ Fringe Search: IDA* passes over a plain list of fringe entries
+      instead of a priority queue.  Entries over the bound wait for the
+      next pass.  Each entry holds its g and its parent entry, so the
+      path needs no came_from, and a cache of best g stops cells being
+      searched again.  With table_size the cache keeps at most that
+      many cells and forgets the least recently improved, which costs
+      repeated work but not optimality.
+  """
+  if stats:
+    stats.start()
+  if not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
+    stats.push(a_node, 1)
+  cache = OrderedDict({a_node: 0})
+  expanded = CellFlags(graph)
+  bound = heuristic(a_node, b_node)
+  now = [(a_node, 0, None)]
+  path = []
+  while now:
+    later = []
+    over = INF
+    while now:
+      entry = now.pop()
+      cp, g, parent = entry
+      if cache.get(cp, g) < g:
+        continue  # a cheaper entry for cp is queued
+      f = g + heuristic(cp, b_node)
+      if f > bound:
+        over = min(over, f)
+        later.append(entry)
+        continue
+      if cp == b_node:
+        path = fringe_path(entry)
+        break
+      expanded.set(cp, REACHED)
+      nbrs = graph.neighbors(cp)
+      if stats:
+        stats.expand(cp, nbrs)
+      for np in reversed(nbrs):
+        new_cost = g + graph.cost(cp, np)
+        old = cache.get(np)
+        if old is None or new_cost < old:
+          if old is not None:
+            cache.move_to_end(np)
+          elif table_size is not None and len(cache) >= table_size:
+            cache.popitem(last=False)
+          cache[np] = new_cost
+          now.append((np, new_cost, entry))
+          if stats:
+            stats.push(np, len(now) + len(later))
+    # every cell still waiting has been expanded before, so all that
+    # can be reached has been, without finding b_node
+    if path or all(expanded.get(cp) for cp, g, parent in later):
+      break
+    later.reverse()
+    now = later
+    bound = over
+  if stats:
+    stats.finish('search', path, None, cache, expanded.flags, now, later)
+  return path
+
+
+def ida_search(graph, a_node, b_node, heuristic=heuristic, table_size=0,
+               stats=None):
+  """ IDA*: depth first passes bounded by f = g + h, each pass raising
+      the bound to the smallest f that went over it.  Memory is the
+      current path, the cell flags, plus (with table_size) a table of
+      at most that many best g values that prunes transpositions within
+      a pass.
+  """
+  if stats:
+    stats.start()
+  if not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
+
+  def expand(cp):
+    nbrs = graph.neighbors(cp)
+    if stats:
+      stats.expand(cp, nbrs)
+    return iter(nbrs)
+
+  bound = heuristic(a_node, b_node)
+  while 1:
+    over = INF
+    path = [a_node]
+    on_path = {a_node}
+    costs = [0]
+    if stats:
+      stats.push(a_node, 1)
+    steps = [expand(a_node)]
+    table = {}
+    flags = CellFlags(graph)
+    flags.set(a_node, REACHED)
+    while steps:
+      cp = path[-1]
+      if cp == b_node:
+        if stats:
+          stats.finish('search', path, None, table, flags.flags, on_path)
+        return path
+      np = next(steps[-1], None)
+      if np is None:
+        steps.pop()
+        costs.pop()
+        on_path.discard(path.pop())
+        continue
+      if np in on_path:
+        continue
+      new_cost = costs[-1] + graph.cost(cp, np)
+      f = new_cost + heuristic(np, b_node)
+      if f > bound:
+        over = min(over, f)
+        flags.set(np, PRUNED)
+        continue
+      if table_size:
+        old = table.get(np)
+        if old is not None and old <= new_cost:
+          continue
+        if old is not None or len(table) < table_size:
+          table[np] = new_cost
+      path.append(np)
+      on_path.add(np)
+      costs.append(new_cost)
+      flags.set(np, REACHED)
+      if stats:
+        stats.push(np, len(path))
+      steps.append(expand(np))
+    # raising the bound only helps if some cell over it was never
+    # reached; otherwise the pass covered all b_node's side
+    if over == INF or not flags.has(PRUNED):
+      return stats.finish('search', [], None, table, flags.flags) if stats else []
+    bound = over
+
+
+# ---------------------------------------------------------------------
+
+# Anytime search
+
+class AnytimeAStar:
+  """ ARA* (Likhachev, Gordon and Thrun).  The first pass inflates the
+      heuristic by weight and finds a path quickly.  Each later pass
+      lowers the weight by step and reuses the g values, queue and
+      inconsistent nodes of the last one instead of starting over.
+      bound is the proven limit on cost / optimal cost.
+  """
+
+  def __init__(self, graph, a_node, b_node, weight=3.0, step=0.5,
+               heuristic=heuristic):
+    self.graph = graph
+    self.a_node = a_node
+    self.b_node = b_node
+    self.eps = weight
+    self.step = step
+    self.heuristic = heuristic
+    self.cost_so_far = {a_node: 0}
+    self.came_from = {a_node: None}
+    self.open = {a_node}
+    self.closed = set()
+    self.incons = set()
+    self.front = PQueue()
+    self.front.put(a_node, self.fvalue(a_node))
+    self.expanded = 0
+    self.path = []
+    self.bound = INF
+    if not reachable(graph, a_node, b_node):
+      self.open.clear()
+      self.bound = 1.0
+
+  def fvalue(self, cp):
+    return self.cost_so_far[cp] + self.eps * self.heuristic(cp, self.b_node)
+
+  def improve(self, stop):
+    """ one ARA* pass; False if stop() cut it short """
+    graph, cost_so_far, came_from = self.graph, self.cost_so_far, self.came_from
+    front, closed = self.front, self.closed
+    while self.open:
+      if cost_so_far.get(self.b_node, INF) <= front.top():
+        break
+      if stop():
+        return False
+      cp = front.get()
+      self.open.discard(cp)
+      closed.add(cp)
+      self.expanded += 1
+      for np in graph.neighbors(cp):
+        new_cost = cost_so_far[cp] + graph.cost(cp, np)
+        if new_cost < cost_so_far.get(np, INF):
+          cost_so_far[np] = new_cost
+          came_from[np] = cp
+          if np in closed:
+            self.incons.add(np)
+          else:
+            self.open.add(np)
+            front.put(np, self.fvalue(np))
+    return True
+
+  def publish(self):
+    """ take the current path and work out its bound """
+    cost = self.cost_so_far.get(self.b_node, INF)
+    lowest = min((self.cost_so_far[cp] + self.heuristic(cp, self.b_node)
+                  for cp in self.open | self.incons), default=INF)
+    if cost == INF:
+      self.path = []
+      self.bound = 1.0 if lowest == INF else INF
+      return
+    self.path = make_path(self.came_from, self.a_node, self.b_node)
+    self.bound = min(self.eps, cost / lowest) if 0 < lowest < INF else 1.0
+    self.bound = max(self.bound, 1.0)
+
+  def run(self, time_limit=None, budget=None):
+    """ Improve until the path is optimal, time_limit seconds pass or
+        budget more nodes are expanded.  Returns (path, bound).
+    """
+    t_end = None if time_limit is None else time.perf_counter() + time_limit
+    e_end = None if budget is None else self.expanded + budget
+
+    def stop():
+      return ((t_end is not None and time.perf_counter() > t_end) or
+              (e_end is not None and self.expanded >= e_end))
+
+    while self.bound > 1.0:
+      if not self.improve(stop):
+        break
+      self.publish()
+      if self.bound <= 1.0 or self.eps <= 1.0:
+        break
+      self.eps = max(1.0, self.eps - self.step)
+      self.open |= self.incons
+      self.incons = set()
+      self.closed = set()
+      self.front = PQueue()
+      for cp in self.open:
+        self.front.put(cp, self.fvalue(cp))
+    return self.path, self.bound
+
+
+def ara_search(graph, a_node, b_node, time_limit=None, budget=None,
+               weight=3.0, step=0.5):
+  """ anytime A*, returns (path, suboptimality bound) """
+  return AnytimeAStar(graph, a_node, b_node, weight, step).run(time_limit, budget)
+
+
+# ---------------------------------------------------------------------
+
+# Bitboard searches.  A grid is one big int with a bit per cell, in
+# rows of cols + 1 bits; the pad bit at the end of each row is always
+# clear, so shifting by one can't wrap into the next row.  A whole BFS
+# layer is then four shifts and two masks.
+
+OPEN_BITS = bytes.maketrans(b'\x00\x01', b'10')
+
+
+def free_bits(graph):
+  """ bitset of the open cells of graph """
+  rows, cols = graph.rows, graph.cols
+  cells = bytes(graph.cells).translate(OPEN_BITS)
+  text = b'0'.join(cells[r * cols:(r + 1) * cols] for r in range(rows))
+  return int((text + b'0')[::-1], 2) if text else 0
+
+
+def bit_layers(graph, a_node, b_node, keep=False):
+  """ BFS layers from a_node until b_node is hit.  Returns the number
+      of steps (-1 if b_node can't be reached) and, with keep, every
+      layer as a bitset.
+  """
+  w = graph.cols + 1
+  free = free_bits(graph)
+  front = seen = 1 << (a_node[0] * w + a_node[1])
+  goal = 1 << (b_node[0] * w + b_node[1])
+  layers = [front] if keep else None
+  steps = 0
+  while not front & goal:
+    front = ((front << 1) | (front >> 1) | (front << w) | (front >> w)) & free & ~seen
+    if not front:
+      return -1, layers
+    seen |= front
+    steps += 1
+    if keep:
+      layers.append(front)
+  return steps, layers
+
+
+def bit_distance(graph, a_node, b_node):
+  """ steps on a shortest path, -1 if there is none """
+  return bit_layers(graph, a_node, b_node)[0]
+
+
+def bit_reachable(graph, a_node, b_node):
+  return bit_layers(graph, a_node, b_node)[0] >= 0
+
+
+def bit_cells(bits, w):
+  """ (r, c) of each set bit """
+  while bits:
+    low = bits & -bits
+    yield divmod(low.bit_length() - 1, w)
+    bits ^= low
+
+
+def layer_stats(stats, layers, w, done):
+  """ count a BFS held as layers in stats: the first done layers were
+      expanded, and every cell was pushed.  Cells are only listed for
+      an observer; generated is not counted.
+  """
+  for i, layer in enumerate(layers):
+    n = bin(layer).count('1')
+    stats.pushes += n
+    stats.peak_frontier = max(stats.peak_frontier, n)
+    if i < done:
+      stats.expanded += n
+    if stats.observer:
+      for cp in bit_cells(layer, w):
+        stats.observer('push', cp)
+        if i < done:
+          stats.observer('expand', cp)
+
+
+def bit_bfs_search(graph, a_node, b_node, stats=None):
+  """ bfs_search on bitboards.  The path is found by walking back from
+      b_node through the stored layers.
+  """
+  if stats:
+    stats.start()
+  steps, layers = bit_layers(graph, a_node, b_node, keep=True)
+  w = graph.cols + 1
+  if stats:
+    stats.lap('search')
+    # the goal's layer is not expanded, unless none holds the goal
+    layer_stats(stats, layers, w, steps if steps >= 0 else len(layers))
+  if steps < 0:
+    return stats.finish('search', [], None, layers) if stats else []
+  came_from = {}
+  cp = b_node
+  for layer in reversed(layers[:-1]):
+    r, c = cp
+    for dr, dc in uGrid.STEPS:
+      np = (r + dr, c + dc)
+      if graph.in_bounds(np) and layer >> (np[0] * w + np[1]) & 1:
+        came_from[cp] = np
+        cp = np
+        break
+  path = make_path(came_from, a_node, b_node)
+  if stats:
+    stats.finish('path', path, None, layers, came_from)
+  return path
+
+
+# ---------------------------------------------------------------------
+
+# Bidirectional searches
+
+def join_paths(fwd_from, bwd_from, a_node, b_node, meet):
+  """ stitch the a_node..meet and meet..b_node halves """
+  head = make_path(fwd_from, a_node, meet)
+  tail = make_path(bwd_from, b_node, meet)
+  if not head or not tail:
+    return []
+  tail.reverse()
+  return head + tail[1:]
+
+
+def bi_bfs_search(graph, a_node, b_node, stats=None):
+  """ Breadth first search from both ends, one layer at a time on the
+      smaller side.  The first layer that touches the other side holds
+      the meeting point of a shortest path.
+  """
+  if stats:
+    stats.start()
+  if a_node == b_node:
+    return stats.finish('check', [a_node]) if stats else [a_node]
+  # the backward side starts in b_node, so it must be enterable
+  if not graph.passable(b_node) or not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
+    stats.push(a_node, 1)
+    stats.push(b_node, 2)
+  came = ({a_node: None}, {b_node: None})
+  dist = ({a_node: 0}, {b_node: 0})
+  fronts = ([a_node], [b_node])
+  meet = None
+  while fronts[0] and fronts[1] and meet is None:
+    side = 0 if len(fronts[0]) <= len(fronts[1]) else 1
+    seen, depth, other = came[side], dist[side], dist[1 - side]
+    waiting = len(fronts[1 - side])
+    layer = []
+    best = None
+    for cp in fronts[side]:
+      nbrs = graph.neighbors(cp)
+      if stats:
+        stats.expand(cp, nbrs)
+      for np in nbrs:
+        if np not in seen:
+          seen[np] = cp
+          depth[np] = depth[cp] + 1
+          layer.append(np)
+          if stats:
+            stats.push(np, len(layer) + waiting)
+          if np in other:
+            total = depth[np] + other[np]
+            if best is None or total < best:
+              best, meet = total, np
+    fronts = (layer, fronts[1]) if side == 0 else (fronts[0], layer)
+  if stats:
+    stats.lap('search')
+  path = [] if meet is None else join_paths(came[0], came[1], a_node, b_node, meet)
+  if stats:
+    stats.finish('path', path, None, *came, *dist)
+  return path
+
+
+def bidirectional_search(graph, a_node, b_node, use_heuristic=True, stats=None):
+  """ Bidirectional Dijkstra, or A* with the average potential
+      p(v) = (h(v, b) - h(v, a)) / 2, which keeps both directions
+      consistent.  The searches alternate and stop once the two queue
+      tops add up to the best a..meet..b cost found.
+  """
+  if stats:
+    stats.start()
+  if a_node == b_node:
+    return stats.finish('check', [a_node]) if stats else [a_node]
+  # the backward side starts in b_node, so it must be enterable
+  if not graph.passable(b_node) or not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
+    stats.push(a_node, 1)
+    stats.push(b_node, 2)
+
+  def potential(v):
+    if use_heuristic:
+      return (heuristic(v, b_node) - heuristic(v, a_node)) / 2
+    return 0
+
+  fronts = (PQueue(), PQueue())
+  came = ({a_node: None}, {b_node: None})
+  cost = ({a_node: 0}, {b_node: 0})
+  fronts[0].put(a_node, potential(a_node))
+  fronts[1].put(b_node, -potential(b_node))
+  best, meet = None, None
+  side = 1
+  while not fronts[0].empty() and not fronts[1].empty():
+    if best is not None and fronts[0].top() + fronts[1].top() >= best:
+      break
+    side = 1 - side
+    sign = 1 if side == 0 else -1
+    front, came_from, cost_so_far, other = \
+      fronts[side], came[side], cost[side], cost[1 - side]
+    cp = front.get()
+    nbrs = graph.neighbors(cp)
+    if stats:
+      stats.expand(cp, nbrs)
+    for np in nbrs:
+      if side == 0:
+        new_cost = cost_so_far[cp] + graph.cost(cp, np)
+      else:
+        new_cost = cost_so_far[cp] + graph.cost(np, cp)
+      if np not in cost_so_far or new_cost < cost_so_far[np]:
+        cost_so_far[np] = new_cost
+        front.put(np, new_cost + sign * potential(np))
+        came_from[np] = cp
+        if stats:
+          stats.push(np, len(fronts[0]) + len(fronts[1]))
+        if np in other:
+          total = new_cost + other[np]
+          if best is None or total < best:
+            best, meet = total, np
+  if stats:
+    stats.lap('search')
+  path = [] if meet is None else join_paths(came[0], came[1], a_node, b_node, meet)
+  if stats:
+    stats.finish('path', path, None, *came, *cost)
+    stats.stale_pops = fronts[0].stale_pops + fronts[1].stale_pops
+  return path
+
+
+def bi_dijkstra_search(graph, a_node, b_node, stats=None):
+  """ Bidirectional Dijkstra search """
+  return bidirectional_search(graph, a_node, b_node, False, stats)
+
+
+def bi_astar_search(graph, a_node, b_node, stats=None):
+  """ Bidirectional AStar search """
+  return bidirectional_search(graph, a_node, b_node, True, stats)
+
+
+# ---------------------------------------------------------------------
+
+# Batch queries on a process pool
+
+worker_grid = None  # the shared grid, inside each worker process
+worker_search = None
+worker_memory = []  # keeps the shared blocks attached
+
+
+def batch_worker_init(names, rows, cols, search):
+  """ attach to the shared grid buffers once per worker """
+  global worker_grid, worker_search, worker_memory
+  worker_memory = [shared_memory.SharedMemory(name) for name in names]
+  cells = worker_memory[0].buf[:rows * cols]
+  weight = None
+  if len(worker_memory) > 1:
+    weight = worker_memory[1].buf[:2 * rows * cols].cast('H')
+  worker_grid = uGrid.Grid.from_buffer(rows, cols, cells, weight)
+  worker_search = search
+
+
+def batch_worker_run(query):
+  i, a_node, b_node = query
+  return i, worker_search(worker_grid, a_node, b_node)
+
+
+def batch_search(graph, queries, search=astar_search, workers=None,
+                 ordered=True, chunksize=32):
+  """ Run search(graph, a, b) for every (a, b) in queries on a process
+      pool.  The cells (and weights) are put in shared memory once, so
+      no task pickles the grid.  Yields the paths in query order, or
+      (i, path) pairs as they complete when ordered is False.
+  """
+  n = graph.rows * graph.cols
+  blocks = [shared_memory.SharedMemory(create=True, size=max(n, 1))]
+  blocks[0].buf[:n] = bytes(graph.cells)
+  if graph.weight is not None:
+    blocks.append(shared_memory.SharedMemory(create=True, size=2 * n))
+    blocks[1].buf[:2 * n] = graph.weight.tobytes()
+  names = [block.name for block in blocks]
+  tasks = ((i, a, b) for i, (a, b) in enumerate(queries))
+  try:
+    with multiprocessing.Pool(workers, batch_worker_init,
+                              (names, graph.rows, graph.cols, search)) as pool:
+      if ordered:
+        for i, path in pool.imap(batch_worker_run, tasks, chunksize):
+          yield path
+      else:
+        yield from pool.imap_unordered(batch_worker_run, tasks, chunksize)
+  finally:
+    for block in blocks:
+      block.close()
+      block.unlink()
+
+
+# ---------------------------------------------------------------------
+
+# Jump Point Search (4-connected, uniform cost)
+
+def is_open(graph, cp):
+  return graph.in_bounds(cp) and graph.passable(cp)
+
+
+def jump_h(graph, cp, dc, goal):
+  """ Run along the row from cp in direction dc.  Stop at the goal, or
+      where a vertical step is forced because the cell beside the
+      previous one is blocked.
+  """
+  r, c = cp
+  while 1:
+    c += dc
+    np = (r, c)
+    if not is_open(graph, np):
+      return None
+    if np == goal:
+      return np
+    for dr in (-1, 1):
+      if is_open(graph, (r + dr, c)) and not is_open(graph, (r + dr, c - dc)):
+        return np
+
+
+def jump_v(graph, cp, dr, goal):
+  """ Run along the column from cp in direction dr.  Stop at the goal,
+      or where a row scan either way finds a jump point.
+  """
+  r, c = cp
+  while 1:
+    r += dr
+    np = (r, c)
+    if not is_open(graph, np):
+      return None
+    if np == goal:
+      return np
+    if jump_h(graph, np, 1, goal) or jump_h(graph, np, -1, goal):
+      return np
+
+
+def jps_directions(graph, cp, parent):
+  """ pruned directions (dr, dc) out of jump point cp """
+  if parent is None:
+    return [(1, 0), (-1, 0), (0, -1), (0, 1)]
+  r, c = cp
+  dr = (r > parent[0]) - (r < parent[0])
+  dc = (c > parent[1]) - (c < parent[1])
+  if dr:
+    return [(dr, 0), (0, -1), (0, 1)]
+  dirs = [(0, dc)]
+  for dr in (-1, 1):
+    if is_open(graph, (r + dr, c)) and not is_open(graph, (r + dr, c - dc)):
+      dirs.append((dr, 0))
+  return dirs
+
+
+def fill_path(points):
+  """ expand a list of aligned jump points into every cell on the way """
+  if not points:
+    return []
+  path = [points[0]]
+  for r, c in points[1:]:
+    pr, pc = path[-1]
+    dr = (r > pr) - (r < pr)
+    dc = (c > pc) - (c < pc)
+    while (pr, pc) != (r, c):
+      pr += dr
+      pc += dc
+      path.append((pr, pc))
+  return path
+
+
+def jps_search(graph, a_node, b_node, queue=PQueue, stats=None):
+  """ Jump Point Search.  Paths are canonical (vertical moves first) so
+      a row is only left where that is forced, and only the jump points
+      are queued, so stats counts jump points.  Falls back to
+      astar_search on weighted grids.
+  """
+  if getattr(graph, 'weight', None) is not None:
+    return astar_search(graph, a_node, b_node, queue, stats=stats)
+  if stats:
+    stats.start()
+  if not reachable(graph, a_node, b_node):
+    return stats.finish('check', []) if stats else []
+  if stats:
+    stats.lap('check')
+  front = queue()
+  front.put(a_node, 0)
+  came_from = {a_node: None}
+  cost_so_far = {a_node: 0}
+  if stats:
+    stats.push(a_node, 1)
+  while not front.empty():
+    cp = front.get()
+    if cp == b_node:
+      break
+    jumps = []
+    for dr, dc in jps_directions(graph, cp, came_from[cp]):
+      if dr:
+        np = jump_v(graph, cp, dr, b_node)
+      else:
+        np = jump_h(graph, cp, dc, b_node)
+      if np is not None:
+        jumps.append(np)
+    if stats:
+      stats.expand(cp, jumps)
+    for np in jumps:
+      new_cost = cost_so_far[cp] + heuristic(cp, np)
+      if np not in cost_so_far or new_cost < cost_so_far[np]:
+        cost_so_far[np] = new_cost
+        k = new_cost + heuristic(np, b_node)
+        front.put(np, k)
+        came_from[np] = cp
+        if stats:
+          stats.push(np, len(front))
+  if stats:
+    stats.lap('search')
+  path = fill_path(make_path(came_from, a_node, b_node))
+  if stats:
+    stats.finish('path', path, front, came_from, cost_so_far)
+  return path
 
 
 # ---------------------------------------------------------------------
@@ -206,8 +1187,185 @@ def test1():
   print(path)
 
 
+def test2():
+  """ queue counters for each priority queue on a weighted grid """
+  grid, start, goal = uGrid.rand_grid(60, 60, 900)
+  for i in range(900):
+    grid.set_weight(uGrid.rand_open(grid), random.randint(2, 5))
+  for search in (dijkstra_search, astar_search):
+    for queue in (PQueue, IndexedPQueue, BucketQueue):
+      front = queue()
+      path = search(grid, start, goal, queue=lambda: front)
+      print(f"{search.__name__:16s} {queue.__name__:14s} len={len(path):3d} "
+            f"pushes={front.pushes} pops={front.pops} stale={front.stale_pops}")
+
+
+def test3():
+  """ astar vs jump point search expansions on an open floor with a
+      long barrier between start and goal
+  """
+  grid = uGrid.Grid(200, 200)
+  for r in range(180):
+    grid.add_wall((r, 100))
+  start, goal = (100, 20), (100, 180)
+  for search in (astar_search, jps_search):
+    front = PQueue()
+    path = search(grid, start, goal, queue=lambda: front)
+    print(f"{search.__name__:14s} len={len(path)} expanded={front.pops}")
+
+
+def test4():
+  """ one-way vs bidirectional searches on a large grid """
+  grid, start, goal = uGrid.rand_grid(300, 300, 27000)
+  for search in (bfs_search, bi_bfs_search, dijkstra_search,
+                 bi_dijkstra_search, astar_search, bi_astar_search):
+    t0 = time.perf_counter()
+    path = search(grid, start, goal)
+    dt = time.perf_counter() - t0
+    print(f"{search.__name__:18s} len={len(path)} {dt*1e3:8.1f} ms")
+  grid = uGrid.Grid(3, 3)
+  grid.add_wall((0, 2))
+  for search in (bfs_search, bi_bfs_search, bi_dijkstra_search, bi_astar_search):
+    print(f"{search.__name__:18s} goal on a wall: {search(grid, (0, 0), (0, 2))}")
+
+
+def test5():
+  """ unreachable goal with and without a component index """
+  grid, start, goal = uGrid.rand_grid(300, 300, 0)
+  for r in range(300):
+    grid.add_wall((r, 150))
+  start, goal = (150, 10), (150, 290)
+  for indexed in (False, True):
+    if indexed:
+      uGrid.Components(grid)
+    t0 = time.perf_counter()
+    path = astar_search(grid, start, goal)
+    dt = time.perf_counter() - t0
+    print(f"components={indexed} len={len(path)} {dt*1e3:8.2f} ms")
+
+
+def test6():
+  """ one query at a time vs batch_search on a process pool """
+  grid, start, goal = uGrid.rand_grid(200, 200, 8000)
+  queries = [(uGrid.rand_open(grid), uGrid.rand_open(grid)) for i in range(200)]
+  t0 = time.perf_counter()
+  paths = [astar_search(grid, a, b) for a, b in queries]
+  t1 = time.perf_counter()
+  print(f"sequential {len(queries)/(t1-t0):8.1f} queries/s")
+  for workers in sorted({1, 2, os.cpu_count() or 1}):
+    t0 = time.perf_counter()
+    batch = list(batch_search(grid, queries, workers=workers))
+    t1 = time.perf_counter()
+    print(f"{workers} workers {len(queries)/(t1-t0):8.1f} queries/s "
+          f"same={batch == paths}")
+
+
+def test7():
+  """ bfs_search vs the bitboard engine on a large open grid """
+  grid, start, goal = uGrid.rand_grid(1000, 1000, 200000)
+  for search in (bfs_search, bit_bfs_search, bit_distance):
+    t0 = time.perf_counter()
+    result = search(grid, start, goal)
+    dt = time.perf_counter() - t0
+    steps = result if isinstance(result, int) else len(result) - 1
+    print(f"{search.__name__:15s} steps={steps} {dt*1e3:8.1f} ms")
+
+
+def test8():
+  """ peak memory of astar vs fringe and IDA*, with and without a
+      bounded table, and both on a goal they can't reach
+  """
+  grid, start, goal = uGrid.rand_grid(40, 40, 300)
+  searches = [astar_search, fringe_search,
+              lambda g, a, b: fringe_search(g, a, b, table_size=400),
+              lambda g, a, b: ida_search(g, a, b, table_size=400)]
+  names = ('astar', 'fringe', 'fringe (table 400)', 'ida (table 400)')
+  for name, search in zip(names, searches):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    path = search(grid, start, goal)
+    dt = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:18s} len={len(path)} {dt*1e3:8.1f} ms peak={peak/1e3:.0f} kB")
+  grid = uGrid.Grid(10, 12)
+  for r in range(10):
+    grid.add_wall((r, 6))
+  for search in (fringe_search, ida_search):
+    t0 = time.perf_counter()
+    path = search(grid, (0, 0), (9, 11), table_size=30)
+    dt = time.perf_counter() - t0
+    print(f"{search.__name__} unreachable len={len(path)} {dt*1e3:.2f} ms")
+
+
+def test9():
+  """ anytime A* with a growing expansion budget """
+  grid, start, goal = uGrid.rand_grid(150, 150, 6000)
+  search = AnytimeAStar(grid, start, goal, weight=4.0)
+  while 1:
+    path, bound = search.run(budget=300)
+    print(f"expanded={search.expanded:6d} eps={search.eps:.1f} "
+          f"len={len(path)} bound={bound:.3f}")
+    if bound <= 1.0:
+      break
+  print(f"astar len={len(astar_search(grid, start, goal))}")
+
+
+def test10():
+  """ depth first path finders without recursion """
+  grid, start, goal = uGrid.rand_grid(150, 150, 7000)
+  t0 = time.perf_counter()
+  path = find_path(grid, start, goal) or []
+  t1 = time.perf_counter()
+  path2 = find_shortest_path(grid, start, goal) or []
+  t2 = time.perf_counter()
+  print(f"find_path len={len(path)} {(t1-t0)*1e3:.1f} ms | "
+        f"find_shortest_path len={len(path2)} {(t2-t1)*1e3:.1f} ms | "
+        f"bfs len={len(bfs_search(grid, start, goal))}")
+  # every simple path is only practical on a small grid
+  grid = uGrid.Grid(6, 6)
+  t0 = time.perf_counter()
+  paths = iter_all_paths(grid, (0, 0), (5, 5), limit=10000)
+  n = sum(1 for p in paths)
+  print(f"first {n} paths on 6x6 in {(time.perf_counter()-t0)*1e3:.0f} ms")
+
+
+def test11():
+  """ what each search did, from SearchStats """
+  grid, start, goal = uGrid.rand_grid(150, 150, 5000)
+  pushed = {}
+
+  def observer(event, cp):
+    if event == 'push':
+      pushed[cp] = pushed.get(cp, 0) + 1
+
+  searches = (fsp, find_shortest_path, bfs_search, dijkstra_search,
+              astar_search, bi_bfs_search, bi_dijkstra_search,
+              bi_astar_search, jps_search, fringe_search, bit_bfs_search)
+  for search in searches:
+    stats = SearchStats(observer)
+    search(grid, start, goal, stats=stats)
+    ms = {k: round(v * 1e3, 2) for k, v in stats.times.items()}
+    print(f"{search.__name__:18s} len={len(stats.path)} "
+          f"expanded={stats.expanded} generated={stats.generated} "
+          f"pushes={stats.pushes} stale={stats.stale_pops} "
+          f"frontier={stats.peak_frontier} "
+          f"tables={stats.peak_bytes/1e3:.0f} kB ms={ms}")
+  print(f"most pushes of one cell: {max(pushed.values())}")
+
+
 # ---------------------------------------------------------------------
 
 if __name__ == "__main__":
 
   test1()
+  test2()
+  test3()
+  test4()
+  test5()
+  test6()
+  test7()
+  test8()
+  test9()
+  test10()
+  test11()
@@ -0,0 +1,258 @@
+# Hierarchical path finding (HPA*)
+
+"""
+The grid is cut into size x size clusters.  Where two clusters touch,
+each run of cells open on both sides gets one or two entrances.  The
+entrance cells are the nodes of an abstract graph, linked across the
+border by one step and inside a cluster by their shortest path within
+the cluster.  A query hooks start and goal into the abstract graph,
+runs A* there and refines each abstract edge with a search that never
+leaves one cluster.  Paths are near optimal.
+
+The hierarchy watches its grid, and a wall or weight change only
+rebuilds the cluster holding the cell (and the neighbour across the
+border when the cell is on one).
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+import time
+from pqueue import PQueue
+from grid_search import astar_search, dijkstra_map, heuristic, make_path
+import uGrid
+
+
+MAX_RUN = 6  # runs at least this long get an entrance at each end
+
+
+class ClusterView:
+  """ The part of a grid inside one cluster """
+
+  def __init__(self, graph, r0, c0, r1, c1):
+    self.graph = graph
+    self.r0, self.c0, self.r1, self.c1 = r0, c0, r1, c1
+
+  def in_bounds(self, cp):
+    r, c = cp
+    return self.r0 <= r < self.r1 and self.c0 <= c < self.c1
+
+  def passable(self, cp):
+    return self.graph.passable(cp)
+
+  def cost(self, a, b):
+    return self.graph.cost(a, b)
+
+  def neighbors(self, cp):
+    return [np for np in self.graph.neighbors(cp) if self.in_bounds(np)]
+
+
+class Hierarchy:
+  """ Abstract graph of cluster entrances over a grid """
+
+  def __init__(self, graph, size=10):
+    self.graph = graph
+    self.size = size
+    self.crows = (graph.rows + size - 1) // size
+    self.ccols = (graph.cols + size - 1) // size
+    self.borders = {}  # (cid, cid) -> [(u, v)] with u in the first cluster
+    self.nodes = {}  # cid -> set of entrance cells
+    self.edges = {}  # cell -> {cell: cost}
+    for cr in range(self.crows):
+      for cc in range(self.ccols):
+        for other in ((cr, cc + 1), (cr + 1, cc)):
+          if other[0] < self.crows and other[1] < self.ccols:
+            self.borders[((cr, cc), other)] = []
+    for key in self.borders:
+      self.build_border(key)
+    for cid in self.clusters():
+      self.build_cluster(cid)
+    graph.watch(self.repair)
+
+  def clusters(self):
+    return [(cr, cc) for cr in range(self.crows) for cc in range(self.ccols)]
+
+  def cluster(self, cp):
+    return cp[0] // self.size, cp[1] // self.size
+
+  def view(self, cid):
+    """ ClusterView of cluster cid """
+    size = self.size
+    r0, c0 = cid[0] * size, cid[1] * size
+    r1 = min(r0 + size, self.graph.rows)
+    c1 = min(c0 + size, self.graph.cols)
+    return ClusterView(self.graph, r0, c0, r1, c1)
+
+  def border_cells(self, key):
+    """ facing cell pairs along the border between two clusters """
+    (cr, cc), (orow, ocol) = key
+    v = self.view((cr, cc))
+    if ocol > cc:
+      return [((r, v.c1 - 1), (r, v.c1)) for r in range(v.r0, v.r1)]
+    return [((v.r1 - 1, c), (v.r1, c)) for c in range(v.c0, v.c1)]
+
+  def build_border(self, key):
+    """ entrances for each run of cells open on both sides """
+    graph = self.graph
+    for u, v in self.borders[key]:
+      self.edges.get(u, {}).pop(v, None)
+      self.edges.get(v, {}).pop(u, None)
+    pairs = []
+    run = []
+    for u, v in self.border_cells(key) + [(None, None)]:
+      if u is not None and graph.passable(u) and graph.passable(v):
+        run.append((u, v))
+        continue
+      if run:
+        if len(run) < MAX_RUN:
+          pairs.append(run[len(run) // 2])
+        else:
+          pairs.append(run[0])
+          pairs.append(run[-1])
+        run = []
+    self.borders[key] = pairs
+    for u, v in pairs:
+      self.edges.setdefault(u, {})[v] = graph.cost(u, v)
+      self.edges.setdefault(v, {})[u] = graph.cost(v, u)
+
+  def cluster_borders(self, cid):
+    """ border keys around cluster cid """
+    cr, cc = cid
+    keys = [((cr, cc - 1), cid), (cid, (cr, cc + 1)),
+            ((cr - 1, cc), cid), (cid, (cr + 1, cc))]
+    return [key for key in keys if key in self.borders]
+
+  def build_cluster(self, cid):
+    """ recollect the entrances of cid and their paths inside it """
+    nodes = set()
+    for key in self.cluster_borders(cid):
+      side = 0 if key[0] == cid else 1
+      nodes.update(pair[side] for pair in self.borders[key])
+    for u in self.nodes.get(cid, ()):
+      if u not in nodes:
+        links = self.edges.pop(u, {})
+        for v in links:
+          self.edges.get(v, {}).pop(u, None)
+    self.nodes[cid] = nodes
+    view = self.view(cid)
+    for u in nodes:
+      links = self.edges.setdefault(u, {})
+      for v in [v for v in links if view.in_bounds(v)]:
+        del links[v]
+      came_from, cost_so_far = dijkstra_map(view, u)
+      for v in nodes:
+        if v != u and v in cost_so_far:
+          links[v] = cost_so_far[v]
+
+  def repair(self, cp):
+    """ rebuild the clusters affected by a change at cp """
+    if not self.graph.in_bounds(cp):
+      return
+    cid = self.cluster(cp)
+    dirty = {cid}
+    for key in self.cluster_borders(cid):
+      if any(cp in pair for pair in self.border_cells(key)):
+        self.build_border(key)
+        dirty.update(key)
+    for d in dirty:
+      self.build_cluster(d)
+
+  def close(self):
+    """ stop watching the grid """
+    self.graph.unwatch(self.repair)
+
+  def links(self, cp, reverse=False, extra=None):
+    """ costs between cp and the entrances of its cluster (and extra,
+        when it is in the same cluster)
+    """
+    cid = self.cluster(cp)
+    came_from, cost_so_far = dijkstra_map(self.view(cid), cp, reverse)
+    links = {v: cost_so_far[v] for v in self.nodes[cid] if v in cost_so_far}
+    if extra in cost_so_far:
+      links[extra] = cost_so_far[extra]
+    return links
+
+  def abstract_path(self, a_node, b_node):
+    """ A* over the entrances, with start and goal hooked in """
+    start_links = self.links(a_node, extra=b_node)
+    goal_links = self.links(b_node, reverse=True)
+    front = PQueue()
+    front.put(a_node, 0)
+    came_from = {a_node: None}
+    cost_so_far = {a_node: 0}
+    while not front.empty():
+      cp = front.get()
+      if cp == b_node:
+        break
+      links = dict(self.edges.get(cp, {}))
+      if cp == a_node:
+        links.update(start_links)
+      if cp in goal_links:
+        links[b_node] = goal_links[cp]
+      for np, w in links.items():
+        new_cost = cost_so_far[cp] + w
+        if np not in cost_so_far or new_cost < cost_so_far[np]:
+          cost_so_far[np] = new_cost
+          front.put(np, new_cost + heuristic(np, b_node))
+          came_from[np] = cp
+    return make_path(came_from, a_node, b_node)
+
+  def search(self, a_node, b_node):
+    """ near optimal path from a_node to b_node """
+    if a_node == b_node:
+      return [a_node]
+    points = self.abstract_path(a_node, b_node)
+    if not points:
+      return []
+    path = [points[0]]
+    for u, v in zip(points, points[1:]):
+      cid = self.cluster(u)
+      if cid != self.cluster(v):
+        path.append(v)  # border crossing
+        continue
+      segment = astar_search(self.view(cid), u, v)
+      if not segment:
+        return []
+      path.extend(segment[1:])
+    return path
+
+
+def hpa_search(graph, a_node, b_node, size=10):
+  """ one-off HPA* query (builds and drops a Hierarchy) """
+  hierarchy = Hierarchy(graph, size)
+  try:
+    return hierarchy.search(a_node, b_node)
+  finally:
+    hierarchy.close()
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ HPA* vs astar on a large random grid """
+  grid, start, goal = uGrid.rand_grid(300, 300, 18000)
+  t0 = time.perf_counter()
+  hierarchy = Hierarchy(grid, 15)
+  t1 = time.perf_counter()
+  print(f"build {(t1-t0)*1e3:.0f} ms, {len(hierarchy.edges)} abstract nodes")
+  for i in range(5):
+    a, b = uGrid.rand_open(grid), uGrid.rand_open(grid)
+    t0 = time.perf_counter()
+    p0 = astar_search(grid, a, b)
+    t1 = time.perf_counter()
+    p1 = hierarchy.search(a, b)
+    t2 = time.perf_counter()
+    print(f"astar len={len(p0)} {(t1-t0)*1e3:7.1f} ms | "
+          f"hpa len={len(p1)} {(t2-t1)*1e3:7.1f} ms")
+  cp = uGrid.rand_open(grid)
+  t0 = time.perf_counter()
+  grid.toggle_wall(cp)
+  print(f"repair after toggle_wall {cp}: {(time.perf_counter()-t0)*1e3:.1f} ms")
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  test1()
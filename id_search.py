@@ -0,0 +1,304 @@
+# Grid Search on flat cell ids
+
+"""
+The searches of grid_search, but keyed on the flat cell id r*cols + c
+instead of (r, c) tuples.  Parents and costs live in preallocated arrays
+(costs as 64-bit ints, as a long path of uint16 weights can pass 2**31)
+and the heap holds plain ints (priority*n + id), so there is no tuple
+allocation, hashing or dict growth per node.  Ties break on the cell id,
+which is the same order as the tuple keys, so the paths are identical
+to the tuple-based searches.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from array import array
+from collections import deque
+from heapq import heappush, heappop
+import random
+import time
+import tracemalloc
+import grid_search
+import uGrid
+
+
+def id_index(graph):
+  """ neighbor index and flat step table of graph """
+  if graph.nbr is None:
+    graph.build_index()
+  return graph.nbr, graph.id_steps()
+
+
+def make_path_id(parent, a, b, cols):
+  """ retrace parent ids to reconstruct an (r, c) path """
+  if parent[b] < 0:
+    return []
+  path = []
+  k = b
+  while k != a:
+    path.append(divmod(k, cols))
+    k = parent[k]
+  path.append(divmod(a, cols))
+  path.reverse()
+  return path
+
+
+def bfs_search_id(graph, a_node, b_node):
+  """ Breadth first search on cell ids """
+  cols = graph.cols
+  n = graph.rows * cols
+  nbr, ksteps = id_index(graph)
+  a = graph.index(a_node)
+  b = graph.index(b_node)
+  parent = array('i', [-1]) * n
+  parent[a] = a
+  front = deque()
+  front.append(a)
+  while front:
+    k = front.popleft()
+    if k == b:
+      break  # early exit
+    for d in ksteps[nbr[k]]:
+      j = k + d
+      if parent[j] < 0:
+        parent[j] = k
+        front.append(j)
+  return make_path_id(parent, a, b, cols)
+
+
+def dijkstra_search_id(graph, a_node, b_node):
+  """ Dijkstra search on cell ids """
+  cols = graph.cols
+  n = graph.rows * cols
+  nbr, ksteps = id_index(graph)
+  weight = graph.weight
+  a = graph.index(a_node)
+  b = graph.index(b_node)
+  parent = array('i', [-1]) * n
+  cost = array('q', [-1]) * n
+  parent[a] = a
+  cost[a] = 0
+  front = [a]
+  while front:
+    g, k = divmod(heappop(front), n)
+    if k == b:
+      break
+    if g > cost[k]:
+      continue  # stale entry
+    for d in ksteps[nbr[k]]:
+      j = k + d
+      new_cost = g + (1 if weight is None else weight[j])
+      old = cost[j]
+      if old < 0 or new_cost < old:
+        cost[j] = new_cost
+        parent[j] = k
+        heappush(front, new_cost * n + j)
+  return make_path_id(parent, a, b, cols)
+
+
+def astar_search_id(graph, a_node, b_node):
+  """ AStar search on cell ids """
+  cols = graph.cols
+  n = graph.rows * cols
+  nbr, ksteps = id_index(graph)
+  weight = graph.weight
+  a = graph.index(a_node)
+  b = graph.index(b_node)
+  br, bc = b_node
+  parent = array('i', [-1]) * n
+  cost = array('q', [-1]) * n
+  parent[a] = a
+  cost[a] = 0
+  front = [a]
+  while front:
+    f, k = divmod(heappop(front), n)
+    if k == b:
+      break
+    r, c = divmod(k, cols)
+    g = cost[k]
+    if f - abs(r - br) - abs(c - bc) > g:
+      continue  # stale entry
+    for d in ksteps[nbr[k]]:
+      j = k + d
+      new_cost = g + (1 if weight is None else weight[j])
+      old = cost[j]
+      if old < 0 or new_cost < old:
+        cost[j] = new_cost
+        parent[j] = k
+        r, c = divmod(j, cols)
+        heappush(front, (new_cost + abs(r - br) + abs(c - bc)) * n + j)
+  return make_path_id(parent, a, b, cols)
+
+
+class Workspace:
+  """ Reusable search state bound to a grid.
+      The parent/cost/closed arrays are kept between queries.  Each query
+      takes a new generation number and a cell only counts as seen (or
+      closed) when its stamp equals the current generation, so there is
+      no allocation and no O(n) clearing per query.
+  """
+  def __init__(self, graph):
+    self.graph = graph
+    self.n = n = graph.rows * graph.cols
+    self.parent = array('i', [0]) * n
+    self.cost = array('q', [0]) * n
+    self.seen = array('I', [0]) * n
+    self.closed = array('I', [0]) * n
+    self.gen = 0
+    self.front = []
+    self.queue = deque()
+    if graph.nbr is None:
+      graph.build_index()
+    self.ksteps = graph.id_steps()
+
+  def next_gen(self):
+    """ start a new query """
+    self.gen += 1
+    if self.gen > 0xffffffff:
+      # stamps wrapped around, pay for one full reset
+      self.seen = array('I', [0]) * self.n
+      self.closed = array('I', [0]) * self.n
+      self.gen = 1
+    self.front.clear()
+    self.queue.clear()
+    return self.gen
+
+  def make_path(self, a, b):
+    """ retrace parent ids of the current query """
+    gen, seen, parent, cols = self.gen, self.seen, self.parent, self.graph.cols
+    if seen[b] != gen:
+      return []
+    path = []
+    k = b
+    while k != a:
+      path.append(divmod(k, cols))
+      k = parent[k]
+    path.append(divmod(a, cols))
+    path.reverse()
+    return path
+
+  def bfs(self, a_node, b_node):
+    """ Breadth first search """
+    gen = self.next_gen()
+    nbr, ksteps = self.graph.nbr, self.ksteps
+    parent, seen, front = self.parent, self.seen, self.queue
+    a = self.graph.index(a_node)
+    b = self.graph.index(b_node)
+    parent[a] = a
+    seen[a] = gen
+    front.append(a)
+    while front:
+      k = front.popleft()
+      if k == b:
+        break  # early exit
+      for d in ksteps[nbr[k]]:
+        j = k + d
+        if seen[j] != gen:
+          seen[j] = gen
+          parent[j] = k
+          front.append(j)
+    return self.make_path(a, b)
+
+  def dijkstra(self, a_node, b_node):
+    """ Dijkstra search """
+    return self.astar(a_node, b_node, False)
+
+  def astar(self, a_node, b_node, use_heuristic=True):
+    """ AStar search """
+    gen = self.next_gen()
+    graph = self.graph
+    n, cols, weight = self.n, graph.cols, graph.weight
+    nbr, ksteps = graph.nbr, self.ksteps
+    parent, cost, seen, closed = self.parent, self.cost, self.seen, self.closed
+    front = self.front
+    a = graph.index(a_node)
+    b = graph.index(b_node)
+    br, bc = b_node
+    parent[a] = a
+    cost[a] = 0
+    seen[a] = gen
+    front.append(a)
+    while front:
+      k = heappop(front) % n
+      if k == b:
+        break
+      if closed[k] == gen:
+        continue  # stale entry
+      closed[k] = gen
+      g = cost[k]
+      for d in ksteps[nbr[k]]:
+        j = k + d
+        new_cost = g + (1 if weight is None else weight[j])
+        if seen[j] != gen or new_cost < cost[j]:
+          seen[j] = gen
+          cost[j] = new_cost
+          parent[j] = k
+          if use_heuristic:
+            r, c = divmod(j, cols)
+            heappush(front, (new_cost + abs(r - br) + abs(c - bc)) * n + j)
+          else:
+            heappush(front, new_cost * n + j)
+    return self.make_path(a, b)
+
+
+# ---------------------------------------------------------------------
+
+def measure(func, grid, start, goal):
+  """ run func once for time, once more for peak traced memory """
+  t0 = time.perf_counter()
+  path = func(grid, start, goal)
+  dt = time.perf_counter() - t0
+  tracemalloc.start()
+  func(grid, start, goal)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return path, dt, peak
+
+
+def bench1(rows=500, cols=500, density=0.3):
+  """ tuple-based vs id-based searches on a large random grid """
+  grid, start, goal = uGrid.rand_grid(rows, cols, int(density * rows * cols))
+  grid.build_index()
+  pairs = [(grid_search.bfs_search, bfs_search_id),
+           (grid_search.dijkstra_search, dijkstra_search_id),
+           (grid_search.astar_search, astar_search_id)]
+  print(f"{rows}x{cols} grid, {grid.nwalls} walls, {start} -> {goal}")
+  for slow, fast in pairs:
+    p0, t0, m0 = measure(slow, grid, start, goal)
+    p1, t1, m1 = measure(fast, grid, start, goal)
+    same = 'same path' if p0 == p1 else 'DIFFERENT PATH'
+    print(f"{slow.__name__:16s} {t0*1e3:9.1f} ms {m0/1e6:8.2f} MB | "
+          f"{fast.__name__:19s} {t1*1e3:9.1f} ms {m1/1e6:8.2f} MB | "
+          f"x{t0/t1:.1f} time, x{m0/max(m1, 1):.1f} memory, {same}")
+
+
+def bench2(rows=1000, cols=1000, density=0.2, queries=500, span=20):
+  """ back-to-back short queries with and without a reusable workspace """
+  grid, start, goal = uGrid.rand_grid(rows, cols, int(density * rows * cols))
+  grid.build_index()
+  pairs = []
+  while len(pairs) < queries:
+    a = uGrid.rand_open(grid)
+    b = (a[0] + random.randint(-span, span), a[1] + random.randint(-span, span))
+    if grid.in_bounds(b) and grid.passable(b):
+      pairs.append((a, b))
+  ws = Workspace(grid)
+  t0 = time.perf_counter()
+  for a, b in pairs:
+    astar_search_id(grid, a, b)
+  t1 = time.perf_counter()
+  for a, b in pairs:
+    ws.astar(a, b)
+  t2 = time.perf_counter()
+  print(f"{queries} queries on {rows}x{cols}: astar_search_id "
+        f"{(t1-t0)/queries*1e3:.3f} ms/query, Workspace.astar "
+        f"{(t2-t1)/queries*1e3:.3f} ms/query")
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  bench1()
+  bench2()
@@ -0,0 +1,169 @@
+# Landmark (ALT) heuristic
+
+"""
+A few landmark cells are picked far apart and a Dijkstra is run from
+each of them.  By the triangle inequality
+
+  d(a, b) >= d(L, b) - d(L, a)   and   d(a, b) >= d(a, L) - d(b, L)
+
+for every landmark L, which gives a much better lower bound than the
+Manhattan distance on maze-like maps.  The distance tables are flat
+int64 arrays (-1 = unreachable) and can be saved for static maps.  On a
+grid without weights the costs are symmetric, so one table per
+landmark serves both directions.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from array import array
+import os
+import struct
+import tempfile
+import time
+from grid_search import astar_search, dijkstra_map, heuristic
+from pqueue import PQueue
+import uGrid
+
+
+MAGIC = b'ALT2'  # ALT1 files had 32-bit tables
+HEADER = struct.Struct('<4siiii')  # magic, rows, cols, k, symmetric
+
+
+def distance_table(graph, cp, reverse=False):
+  """ costs from cp (to cp with reverse) as a flat array """
+  came_from, cost_so_far = dijkstra_map(graph, cp, reverse)
+  table = array('q', [-1]) * (graph.rows * graph.cols)
+  cols = graph.cols
+  for (r, c), d in cost_so_far.items():
+    table[r * cols + c] = d
+  return table
+
+
+class Landmarks:
+  """ Landmark distance tables for one grid """
+
+  def __init__(self, rows, cols, points, fwd, bwd):
+    self.rows = rows
+    self.cols = cols
+    self.points = points
+    self.fwd = fwd  # fwd[i][k] = d(points[i], k)
+    self.bwd = bwd  # bwd[i][k] = d(k, points[i])
+
+  def heuristic(self, a, b):
+    """ best landmark lower bound on the cost from a to b """
+    cols = self.cols
+    ka = a[0] * cols + a[1]
+    kb = b[0] * cols + b[1]
+    h = abs(a[0] - b[0]) + abs(a[1] - b[1])
+    for f, g in zip(self.fwd, self.bwd):
+      fa, fb = f[ka], f[kb]
+      if fa >= 0 and fb >= 0 and fb - fa > h:
+        h = fb - fa
+      ga, gb = g[ka], g[kb]
+      if ga >= 0 and gb >= 0 and ga - gb > h:
+        h = ga - gb
+    return h
+
+  def save(self, filename):
+    symmetric = self.fwd is self.bwd
+    with open(filename, 'wb') as f:
+      f.write(HEADER.pack(MAGIC, self.rows, self.cols, len(self.points), symmetric))
+      array('i', [v for cp in self.points for v in cp]).tofile(f)
+      for table in self.fwd:
+        table.tofile(f)
+      if not symmetric:
+        for table in self.bwd:
+          table.tofile(f)
+
+
+def load_landmarks(filename, graph=None):
+  """ load tables saved by Landmarks.save, checking them against graph """
+  with open(filename, 'rb') as f:
+    magic, rows, cols, k, symmetric = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+      raise ValueError(f'{filename} is not a landmark file')
+    if graph is not None and (graph.rows, graph.cols) != (rows, cols):
+      raise ValueError(f'{filename} is for a {rows}x{cols} grid')
+    flat = array('i')
+    flat.fromfile(f, 2 * k)
+    points = [(flat[2 * i], flat[2 * i + 1]) for i in range(k)]
+    fwd = []
+    for i in range(k):
+      table = array('q')
+      table.fromfile(f, rows * cols)
+      fwd.append(table)
+    bwd = fwd
+    if not symmetric:
+      bwd = []
+      for i in range(k):
+        table = array('q')
+        table.fromfile(f, rows * cols)
+        bwd.append(table)
+  return Landmarks(rows, cols, points, fwd, bwd)
+
+
+def build_landmarks(graph, k=8):
+  """ Pick k landmarks by farthest point selection and tabulate them.
+      Each new landmark is the open cell farthest from those already
+      chosen; cells none of them can reach count as infinitely far, so
+      separate regions get landmarks of their own.
+  """
+  symmetric = getattr(graph, 'weight', None) is None
+  n = graph.rows * graph.cols
+  points, fwd, bwd = [], [], []
+  nearest = array('q', [-1]) * n  # distance to the nearest landmark
+  seed = next(((r, c) for r in range(graph.rows) for c in range(graph.cols)
+               if graph.passable((r, c))), None)
+  if seed is None:
+    return Landmarks(graph.rows, graph.cols, points, fwd, bwd)
+  first = distance_table(graph, seed)
+  cp = graph.point(max(range(n), key=first.__getitem__))
+  while len(points) < k:
+    points.append(cp)
+    f = distance_table(graph, cp)
+    fwd.append(f)
+    bwd.append(f if symmetric else distance_table(graph, cp, reverse=True))
+    for i in range(n):
+      if f[i] >= 0 and (nearest[i] < 0 or f[i] < nearest[i]):
+        nearest[i] = f[i]
+    cp, far = None, 0
+    for i in range(n):
+      d = nearest[i]
+      if d < 0 and graph.passable(graph.point(i)):
+        cp = graph.point(i)
+        break
+      if d > far:
+        cp, far = graph.point(i), d
+    if cp is None:
+      break
+  if symmetric:
+    bwd = fwd
+  return Landmarks(graph.rows, graph.cols, points, fwd, bwd)
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ manhattan vs landmark heuristic on a dense random grid """
+  grid, start, goal = uGrid.rand_grid(150, 150, 8000)
+  t0 = time.perf_counter()
+  lm = build_landmarks(grid, 8)
+  print(f"8 landmarks in {(time.perf_counter()-t0)*1e3:.0f} ms")
+  for h in (heuristic, lm.heuristic):
+    front = PQueue()
+    path = astar_search(grid, start, goal, lambda: front, h)
+    print(f"len={len(path)} expanded={front.pops}")
+  filename = os.path.join(tempfile.gettempdir(), 'landmarks.alt')
+  lm.save(filename)
+  again = load_landmarks(filename, grid)
+  os.remove(filename)
+  print('reloaded', again.points == lm.points and again.fwd == lm.fwd)
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  test1()
@@ -0,0 +1,172 @@
+# MovingAI benchmark maps and scenarios
+
+"""
+Reader for the grid benchmark files of movingai.com.  A .map file is a
+short header (type, height, width, map) and then one line of terrain
+characters per row; '.', 'G' and 'S' are passable and everything else
+('@', 'O', 'T', 'W') is a wall.  Rows are translated to wall bytes
+straight into the cell buffer of a Grid, one row at a time.
+
+A .scen file has one query per line:
+
+  bucket  map  width  height  start x  start y  goal x  goal y  optimal
+
+where x is the column and y the row.  The lengths in the standard
+sets are for 8-connected (octile) moves, but Grid moves in 4 directions.
+Each diagonal can be replaced by two straight steps, so an optimal
+4-connected length lies between optimal and sqrt(2) * optimal.  That is
+what the runner checks, unless --exact is given for scenario sets made
+for 4-connected moves.
+
+  python movingai.py maps/arena.map.scen --search astar_search
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+import argparse
+import math
+import os
+import sys
+import time
+import grid_search
+import uGrid
+
+
+OPEN = b'.GS'
+WALL = bytes(0 if i in OPEN else 1 for i in range(256))
+EPS = 1e-4
+
+
+def load_map(filename):
+  """ Grid from a MovingAI .map file """
+  with open(filename, 'rb') as f:
+    header = {}
+    for line in f:
+      line = line.strip()
+      if line == b'map':
+        break
+      key, _, value = line.partition(b' ')
+      header[key.decode()] = value.decode().strip()
+    rows, cols = int(header['height']), int(header['width'])
+    cells = bytearray(rows * cols)
+    r = 0
+    for line in f:
+      line = line.rstrip(b'\r\n')
+      if not line:
+        continue
+      if len(line) != cols or r >= rows:
+        raise ValueError(f'{filename}: row {r} does not fit {rows}x{cols}')
+      cells[r * cols:(r + 1) * cols] = line.translate(WALL)
+      r += 1
+    if r != rows:
+      raise ValueError(f'{filename}: {r} rows, expected {rows}')
+  return uGrid.Grid.from_buffer(rows, cols, cells)
+
+
+def save_map(grid, filename):
+  """ write grid as a .map file ('@' walls, '.' open) """
+  with open(filename, 'w') as f:
+    f.write(f'type octile\nheight {grid.rows}\nwidth {grid.cols}\nmap\n')
+    cols = grid.cols
+    for r in range(grid.rows):
+      row = grid.cells[r * cols:(r + 1) * cols]
+      f.write(row.translate(b'.@' + bytes(254)).decode() + '\n')
+
+
+def load_scen(filename):
+  """ yield (bucket, map name, start, goal, optimal) from a .scen file """
+  with open(filename) as f:
+    for line in f:
+      fields = line.split('\t') if '\t' in line else line.split()
+      if len(fields) < 9 or fields[0] == 'version':
+        continue
+      bucket, name = int(fields[0]), fields[1]
+      sx, sy, gx, gy = (int(v) for v in fields[4:8])
+      yield bucket, name, (sy, sx), (gy, gx), float(fields[8])
+
+
+def find_map(scen_file, name):
+  """ the map a scenario names, next to the .scen file or below it """
+  here = os.path.dirname(scen_file)
+  for path in (os.path.join(here, name),
+               os.path.join(here, os.path.basename(name)), name):
+    if os.path.exists(path):
+      return path
+  raise FileNotFoundError(name)
+
+
+def path_length(graph, path):
+  return sum(graph.cost(a, b) for a, b in zip(path, path[1:]))
+
+
+def run_scen(scen_file, search, map_file=None, exact=False, limit=None):
+  """ Run every scenario of scen_file through search(grid, a, b).
+      Returns {bucket: [seconds]} and a list of failed scenarios.
+  """
+  grids = {}
+  times = {}
+  failed = []
+  for i, (bucket, name, start, goal, optimal) in enumerate(load_scen(scen_file)):
+    if limit is not None and i >= limit:
+      break
+    path = map_file or find_map(scen_file, name)
+    if path not in grids:
+      grids[path] = load_map(path)
+    grid = grids[path]
+    t0 = time.perf_counter()
+    found = search(grid, start, goal)
+    times.setdefault(bucket, []).append(time.perf_counter() - t0)
+    length = path_length(grid, found) if found else None
+    if exact:
+      ok = length is not None and abs(length - optimal) < EPS
+    else:
+      ok = (length is not None and
+            optimal - EPS <= length <= math.sqrt(2) * optimal + EPS)
+    if not ok:
+      failed.append((i, bucket, start, goal, optimal, length))
+  return times, failed
+
+
+def report(name, times, failed, total):
+  """ print what run_scen found; 1 if any scenario failed, else 0 """
+  n = sum(len(t) for t in times.values())
+  busy = sum(sum(t) for t in times.values())
+  print(f"{name}: {n} scenarios in {total:.2f} s "
+        f"({n / busy if busy else 0:.1f} queries/s searching)")
+  print("bucket      n   mean ms    p50 ms    max ms")
+  for bucket in sorted(times):
+    t = sorted(times[bucket])
+    print(f"{bucket:6d} {len(t):6d} {sum(t) / len(t) * 1e3:9.2f} "
+          f"{t[len(t) // 2] * 1e3:9.2f} {t[-1] * 1e3:9.2f}")
+  for i, bucket, start, goal, optimal, length in failed[:20]:
+    print(f"failed #{i} bucket {bucket} {start} -> {goal}: "
+          f"optimal {optimal}, got {length}")
+  print(f"{len(failed)} failed")
+  return 1 if failed else 0
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='run MovingAI scenarios')
+  parser.add_argument('scen')
+  parser.add_argument('--map', default=None,
+                      help='map file (default: the one each scenario names)')
+  parser.add_argument('--search', default='astar_search',
+                      help='search function in grid_search')
+  parser.add_argument('--exact', action='store_true',
+                      help='lengths must match (4-connected scenarios)')
+  parser.add_argument('--limit', type=int, default=None)
+  args = parser.parse_args(argv)
+
+  search = getattr(grid_search, args.search)
+  t0 = time.perf_counter()
+  times, failed = run_scen(args.scen, search, args.map, args.exact, args.limit)
+  return report(args.search, times, failed, time.perf_counter() - t0)
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  sys.exit(main())
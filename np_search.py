@@ -0,0 +1,131 @@
+# NumPy wavefront distance transform
+
+"""
+Breadth first distances over whole arrays.  The frontier is a boolean
+array; one layer is four shifted ORs masked with the open, unvisited
+cells, so the per-cell Python loop of fsp/bfs_search disappears.  Each
+layer only touches the bounding box of the frontier plus one cell.
+
+NumPy is optional: the rest of the package runs without it, and these
+functions raise ImportError when it is missing.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+import time
+from grid_search import fsp, make_path
+import uGrid
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+def require_numpy():
+  if numpy is None:
+    raise ImportError('np_search needs numpy')
+  return numpy
+
+
+def wall_mask(graph):
+  """ rows x cols bool array, True on walls """
+  require_numpy()
+  cells = numpy.frombuffer(bytes(graph.cells), dtype=numpy.uint8)
+  return cells.reshape(graph.rows, graph.cols).astype(bool)
+
+
+def bbox(mask):
+  """ r0, r1, c0, c1 of the True cells (empty when r0 == r1) """
+  rows = numpy.flatnonzero(mask.any(axis=1))
+  if not len(rows):
+    return 0, 0, 0, 0
+  cols = numpy.flatnonzero(mask.any(axis=0))
+  return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+
+def bfs_distances(graph, sources):
+  """ steps from the nearest of sources to every cell (-1 = cannot
+      reach), as a rows x cols int32 array
+  """
+  require_numpy()
+  rows, cols = graph.rows, graph.cols
+  free = ~wall_mask(graph)
+  dist = numpy.full((rows, cols), -1, dtype=numpy.int32)
+  front = numpy.zeros((rows, cols), dtype=bool)
+  for r, c in sources:
+    front[r, c] = True
+  dist[front] = 0
+  free &= ~front
+  r0, r1, c0, c1 = bbox(front)
+  d = 0
+  while r0 < r1:
+    d += 1
+    a0, a1 = max(r0 - 1, 0), min(r1 + 1, rows)
+    b0, b1 = max(c0 - 1, 0), min(c1 + 1, cols)
+    f = front[a0:a1, b0:b1]
+    nxt = numpy.zeros_like(f)
+    nxt[1:] |= f[:-1]
+    nxt[:-1] |= f[1:]
+    nxt[:, 1:] |= f[:, :-1]
+    nxt[:, :-1] |= f[:, 1:]
+    nxt &= free[a0:a1, b0:b1]
+    front[a0:a1, b0:b1] = nxt
+    free[a0:a1, b0:b1] &= ~nxt
+    dist[a0:a1, b0:b1][nxt] = d
+    r0, r1, c0, c1 = bbox(nxt)
+    r0, r1, c0, c1 = r0 + a0, r1 + a0, c0 + b0, c1 + b0
+  return dist
+
+
+def reachable_mask(graph, sources):
+  """ True on every cell some source can reach """
+  return bfs_distances(graph, sources) >= 0
+
+
+def path_from_distances(graph, dist, b_node):
+  """ Walk down the distances from b_node to a source and return the
+      path from that source, built with make_path.
+  """
+  r, c = b_node
+  if dist[r, c] < 0:
+    return []
+  came_from = {}
+  cp = b_node
+  while dist[cp] > 0:
+    # sources may be walls, so look at every in-bounds step
+    r, c = cp
+    for dr, dc in uGrid.STEPS:
+      np = (r + dr, c + dc)
+      if graph.in_bounds(np) and dist[np] == dist[cp] - 1:
+        came_from[cp] = np
+        cp = np
+        break
+  return make_path(came_from, cp, b_node)
+
+
+# ---------------------------------------------------------------------
+
+def bench1(rows=600, cols=600, density=0.3):
+  """ fsp vs vectorized distances on one large grid """
+  require_numpy()
+  grid, start, goal = uGrid.rand_grid(rows, cols, int(density * rows * cols))
+  t0 = time.perf_counter()
+  p0 = fsp(grid, start, goal)
+  t1 = time.perf_counter()
+  dist = bfs_distances(grid, [start])
+  t2 = time.perf_counter()
+  p1 = path_from_distances(grid, dist, goal)
+  t3 = time.perf_counter()
+  print(f"{rows}x{cols}: fsp {(t1-t0)*1e3:.0f} ms len={len(p0)} | "
+        f"bfs_distances {(t2-t1)*1e3:.0f} ms + path {(t3-t2)*1e3:.1f} ms "
+        f"len={len(p1)}")
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  bench1()
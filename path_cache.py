@@ -0,0 +1,152 @@
+# Path cache
+
+"""
+LRU cache of optimal paths in front of astar_search/dijkstra_search.
+
+A query that lies on a cached path (a before b) is answered with the
+slice between them, since every part of an optimal path is optimal.
+The cache watches its grid and evicts only what an edit can affect:
+
+  - paths that cross the changed cell, and
+  - when the cell is open afterwards (a wall removed, or a weight
+    changed), paths whose cost is more than the Manhattan length of
+    the detour a -> cell -> b, since that detour might now be shorter.
+
+The cache remembers the grid version it last checked against; a
+version it has not seen (an edit that bypassed the watcher) clears it.
+"""
+
+__author__ = 'Bruce Wernick'
+__date__ = '29 August 2021'
+
+
+from collections import OrderedDict
+import random
+from grid_search import astar_search, dijkstra_search, heuristic
+import uGrid
+
+
+INF = float('inf')
+
+
+def path_cost(graph, path):
+  if not path:
+    return INF
+  return sum(graph.cost(a, b) for a, b in zip(path, path[1:]))
+
+
+class PathCache:
+  """ Bounded LRU cache of (a_node, b_node) -> path """
+
+  def __init__(self, graph, search=astar_search, size=1024):
+    self.graph = graph
+    self.search = search
+    self.size = size
+    self.entries = OrderedDict()  # (a, b) -> (path, cost)
+    self.crossing = {}  # cell -> set of keys whose path crosses it
+    self.version = graph.version
+    self.hits = 0
+    self.sub_hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+    graph.watch(self.invalidate)
+
+  def close(self):
+    """ stop watching the grid """
+    self.graph.unwatch(self.invalidate)
+
+  def stats(self):
+    return {'entries': len(self.entries), 'hits': self.hits,
+            'sub_hits': self.sub_hits, 'misses': self.misses,
+            'evictions': self.evictions, 'invalidations': self.invalidations}
+
+  def clear(self):
+    self.entries.clear()
+    self.crossing.clear()
+    self.version = self.graph.version
+
+  def get(self, a_node, b_node):
+    """ cached path from a_node to b_node, searching on a miss """
+    if self.graph.version != self.version:
+      self.clear()
+    key = (a_node, b_node)
+    if key in self.entries:
+      self.entries.move_to_end(key)
+      self.hits += 1
+      return list(self.entries[key][0])
+    path = self.sub_path(a_node, b_node)
+    if path is not None:
+      self.sub_hits += 1
+      return path
+    self.misses += 1
+    path = self.search(self.graph, a_node, b_node)
+    self.put(key, path)
+    return list(path)
+
+  def sub_path(self, a_node, b_node):
+    """ slice of a cached path that visits a_node and later b_node """
+    keys = self.crossing.get(a_node)
+    other = self.crossing.get(b_node)
+    if not keys or not other:
+      return None
+    for key in keys & other:
+      path = self.entries[key][0]
+      i = path.index(a_node)
+      j = path.index(b_node)
+      if i <= j:
+        self.entries.move_to_end(key)
+        return path[i:j + 1]
+    return None
+
+  def put(self, key, path):
+    self.entries[key] = (path, path_cost(self.graph, path))
+    for cp in path:
+      self.crossing.setdefault(cp, set()).add(key)
+    while len(self.entries) > self.size:
+      self.drop(next(iter(self.entries)))
+      self.evictions += 1
+
+  def drop(self, key):
+    path, cost = self.entries.pop(key)
+    for cp in path:
+      keys = self.crossing[cp]
+      keys.discard(key)
+      if not keys:
+        del self.crossing[cp]
+
+  def invalidate(self, cp):
+    """ grid watcher: evict the entries a change at cp can affect """
+    stale = set(self.crossing.get(cp, ()))
+    if self.graph.in_bounds(cp) and self.graph.passable(cp):
+      for key, (path, cost) in self.entries.items():
+        a_node, b_node = key
+        if heuristic(a_node, cp) + heuristic(cp, b_node) < cost:
+          stale.add(key)
+    for key in stale:
+      self.drop(key)
+    self.invalidations += len(stale)
+    self.version = self.graph.version
+
+
+# ---------------------------------------------------------------------
+
+def test1():
+  """ repeated queries with a few wall edits in between """
+  grid, start, goal = uGrid.rand_grid(100, 100, 2000)
+  cache = PathCache(grid, dijkstra_search, size=1024)
+  spots = [uGrid.rand_open(grid) for i in range(30)]
+  for i in range(2000):
+    a, b = random.choice(spots), random.choice(spots)
+    cache.get(a, b)
+    if i % 500 == 499:
+      grid.toggle_wall(uGrid.rand_open(grid))
+  print(cache.stats())
+  cache.close()
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+
+  test1()
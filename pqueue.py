@@ -1,5 +1,15 @@
 # Priority Queue using Python's heapq
 
+"""
+All queues share the put/get/empty interface used by the searches and
+count pushes, pops and stale pops (entries skipped because the item was
+put again with a newer priority).  len() is the number of live items.
+
+  PQueue        binary heap with lazy deletion of stale entries
+  IndexedPQueue binary heap holding each item once, with decrease_key
+  BucketQueue   Dial's bucket queue for small non-negative int priorities
+"""
+
 __author__ = 'Bruce Wernick'
 __date__ = '29 August 2021'
 
@@ -13,12 +23,202 @@ class PQueue:
 
   def __init__(self):
     self.elements = []
+    self.latest = {}  # item -> priority of its newest entry
+    self.pushes = 0
+    self.pops = 0
+    self.stale_pops = 0
+
+  def purge(self):
+    """ drop stale entries from the top of the heap """
+    elements, latest = self.elements, self.latest
+    while elements and latest.get(elements[0][1]) != elements[0][0]:
+      heapq.heappop(elements)
+      self.stale_pops += 1
+
+  def __len__(self):
+    """ number of live items """
+    return len(self.latest)
 
   def empty(self):
+    self.purge()
     return not self.elements
 
+  def top(self):
+    """ smallest live priority """
+    self.purge()
+    return self.elements[0][0]
+
   def put(self, item, priority):
+    self.latest[item] = priority
     heapq.heappush(self.elements, (priority, item))
+    self.pushes += 1
+
+  def get(self):
+    self.purge()
+    item = heapq.heappop(self.elements)[1]
+    del self.latest[item]
+    self.pops += 1
+    return item
+
+
+class IndexedPQueue:
+
+  """ Indexed binary heap.  Each item is held once and pos maps it to
+      its slot, so putting a queued item again moves it in place.
+  """
+
+  def __init__(self):
+    self.heap = []  # (priority, item)
+    self.pos = {}
+    self.pushes = 0
+    self.pops = 0
+    self.stale_pops = 0
+    self.decreases = 0
+
+  def __len__(self):
+    return len(self.pos)
+
+  def empty(self):
+    return not self.heap
+
+  def contains(self, item):
+    return item in self.pos
+
+  def top(self):
+    return self.heap[0][0]
+
+  def peek(self):
+    """ item with the smallest priority, left in the queue """
+    return self.heap[0][1]
+
+  def priority(self, item):
+    return self.heap[self.pos[item]][0]
+
+  def put(self, item, priority):
+    """ insert item, or move it if it is already queued """
+    if item in self.pos:
+      if priority < self.priority(item):
+        self.decrease_key(item, priority)
+      else:
+        i = self.pos[item]
+        self.heap[i] = (priority, item)
+        self.sift_down(i)
+      return
+    self.heap.append((priority, item))
+    self.pos[item] = len(self.heap) - 1
+    self.sift_up(len(self.heap) - 1)
+    self.pushes += 1
+
+  def decrease_key(self, item, priority):
+    i = self.pos[item]
+    if priority > self.heap[i][0]:
+      raise ValueError('decrease_key with a larger priority')
+    self.heap[i] = (priority, item)
+    self.sift_up(i)
+    self.decreases += 1
+
+  def get(self):
+    item = self.heap[0][1]
+    self.remove(item)
+    self.pops += 1
+    return item
+
+  def remove(self, item):
+    """ take item out of the queue """
+    heap, pos = self.heap, self.pos
+    i = pos.pop(item)
+    last = heap.pop()
+    if i < len(heap):
+      heap[i] = last
+      pos[last[1]] = i
+      self.sift_down(i)
+      self.sift_up(pos[last[1]])
+
+  def sift_up(self, i):
+    heap, pos = self.heap, self.pos
+    entry = heap[i]
+    while i > 0:
+      p = (i - 1) >> 1
+      if not entry < heap[p]:
+        break
+      heap[i] = heap[p]
+      pos[heap[i][1]] = i
+      i = p
+    heap[i] = entry
+    pos[entry[1]] = i
+
+  def sift_down(self, i):
+    heap, pos = self.heap, self.pos
+    n = len(heap)
+    entry = heap[i]
+    while 1:
+      c = 2 * i + 1
+      if c >= n:
+        break
+      if c + 1 < n and heap[c + 1] < heap[c]:
+        c += 1
+      if not heap[c] < entry:
+        break
+      heap[i] = heap[c]
+      pos[heap[i][1]] = i
+      i = c
+    heap[i] = entry
+    pos[entry[1]] = i
+
+
+class BucketQueue:
+
+  """ Dial's bucket queue for small non-negative integer priorities,
+      such as the path costs from Grid.cost.  Put and get are O(1)
+      apart from walking over empty buckets.  Items put again with a
+      new priority leave a stale entry behind that get skips.
+  """
+
+  def __init__(self):
+    self.buckets = []
+    self.cursor = 0
+    self.latest = {}
+    self.pushes = 0
+    self.pops = 0
+    self.stale_pops = 0
+
+  def purge(self):
+    """ advance the cursor to the first live entry """
+    buckets, latest = self.buckets, self.latest
+    while self.cursor < len(buckets):
+      bucket = buckets[self.cursor]
+      while bucket and latest.get(bucket[-1]) != self.cursor:
+        bucket.pop()
+        self.stale_pops += 1
+      if bucket:
+        return
+      self.cursor += 1
+
+  def __len__(self):
+    """ number of live items """
+    return len(self.latest)
+
+  def empty(self):
+    self.purge()
+    return self.cursor >= len(self.buckets)
+
+  def top(self):
+    self.purge()
+    return self.cursor
+
+  def put(self, item, priority):
+    buckets = self.buckets
+    if priority >= len(buckets):
+      buckets.extend([] for i in range(priority + 1 - len(buckets)))
+    buckets[priority].append(item)
+    self.latest[item] = priority
+    if priority < self.cursor:
+      self.cursor = priority
+    self.pushes += 1
 
   def get(self):
-    return heapq.heappop(self.elements)[1]
+    self.purge()
+    item = self.buckets[self.cursor].pop()
+    del self.latest[item]
+    self.pops += 1
+    return item
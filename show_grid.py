@@ -6,6 +6,7 @@ __date__ = '29 August 2021'
 import tkinter as tk
 from grid_search import *
 from uColor import hex_lerp
+from dstar_lite import DStarLite
 import uGrid
 
 
@@ -40,6 +41,7 @@ class MainForm(tk.Frame):
 
     nwalls = int(1.616*(self.ny + self.nx))
     self.grid, self.start, self.goal = uGrid.rand_grid(self.ny, self.nx, nwalls)
+    self.planner = DStarLite(self.grid, self.start, self.goal)
     self.do_search()
 
     self.canvas.place(x=20, y=20)
@@ -82,8 +84,8 @@ class MainForm(tk.Frame):
       self.shade_rect(j, i, "#486270", "wall")
 
     #  find_path, shortest_path, fsp, bfs_search, dijkstra_search, astar_search
-    search_func = astar_search
-    self.path = search_func(self.grid, self.start, self.goal)
+    #  all search from scratch, the D* Lite planner only repairs what changed
+    self.path = self.planner.plan()
 
     self.canvas.delete("path")
     n = len(self.path) - 1
@@ -106,6 +108,8 @@ class MainForm(tk.Frame):
     nx = self.nx
     nwalls = int(1.616*(ny+nx))
     self.grid, self.start, self.goal = uGrid.rand_grid(ny, nx, nwalls)
+    self.planner.close()
+    self.planner = DStarLite(self.grid, self.start, self.goal)
     self.do_search()
 
   def place_start(self, event):
@@ -113,6 +117,7 @@ class MainForm(tk.Frame):
     j = int(event.y / self.dy)
     i = int(event.x / self.dx)
     self.start = (j, i)
+    self.planner.move_start(self.start)
     self.do_search()
 
   def place_goal(self, event):
@@ -120,6 +125,8 @@ class MainForm(tk.Frame):
     j = int(event.y / self.dy)
     i = int(event.x / self.dx)
     self.goal = (j, i)
+    self.planner.close()
+    self.planner = DStarLite(self.grid, self.start, self.goal)
     self.do_search()
 
   def toggle_wall(self, event):
@@ -2,36 +2,221 @@
 
 """
 2D Square grid thanks to Amit Patel Red Blob Games.
+
+Cells are stored row-major in flat arrays, so a cell (r, c) lives at
+index r*cols + c.  Walls are a bytearray (1 = wall) and the optional
+weight plane is an array of small unsigned ints (the cost of stepping
+into a cell).  This gives O(1) wall and weight lookups.
 """
 
 __author__ = 'Bruce Wernick'
 __date__ = '29 August 2021'
 
 
+from array import array
+from collections import deque
+import random
+from types import MappingProxyType
 import uRandom
 
 
+# unit steps in the order neighbors() lists them, one index bit per step
+STEPS = ((1, 0), (-1, 0), (0, -1), (0, 1))
+OPPOSITE = (1, 0, 3, 2)
+PARITY = 16  # index bit set on cells where r + c is odd
+
+
+def make_step_table():
+  """ steps for every index byte (parity bit + step mask).  Even cells
+      list the steps in reverse, which is what keeps the paths looking
+      straight.
+  """
+  table = []
+  for m in range(2 * PARITY):
+    steps = [STEPS[b] for b in range(4) if m >> b & 1]
+    if not m & PARITY:
+      steps.reverse()
+    table.append(tuple(steps))
+  return table
+
+
+STEP_TABLE = make_step_table()
+
+
 class Grid:
   """ 2D Square grid with walls and weights.
   """
   def __init__(self, rows, cols):
     self.rows = rows
     self.cols = cols
-    self.walls = []
-    self.weights = {}
+    self.cells = bytearray(rows * cols)
+    self.weight = None  # allocated on the first set_weight
+    self.nwalls = 0
+    self.nbr = None  # neighbor bitmasks, see build_index
+    self.version = 0  # bumped on every wall or weight change
+    self.watchers = []
+    self.components = None  # see Components
+
+  @classmethod
+  def from_buffer(cls, rows, cols, cells, weight=None):
+    """ Grid over existing cell (and weight) buffers, such as shared
+        memory.  The buffers are used in place, not copied.
+    """
+    grid = cls(0, 0)
+    grid.rows = rows
+    grid.cols = cols
+    grid.cells = cells
+    grid.weight = weight
+    grid.nwalls = bytes(cells).count(1)
+    return grid
+
+  def index(self, cp):
+    """ flat cell index of cp """
+    r, c = cp
+    return r * self.cols + c
+
+  def point(self, k):
+    """ (r, c) point of flat cell index k """
+    return divmod(k, self.cols)
+
+  @property
+  def walls(self):
+    """ Tuple of wall positions.  It is a snapshot; use add_wall and
+        remove_wall (or assign a new sequence) to change the walls.
+    """
+    cols = self.cols
+    return tuple(divmod(k, cols) for k, v in enumerate(self.cells) if v)
+
+  @walls.setter
+  def walls(self, walls):
+    for cp in self.walls:
+      self.remove_wall(cp)
+    for cp in walls:
+      self.add_wall(cp)
+
+  @property
+  def weights(self):
+    """ Read-only mapping of cells with a weight other than 1.  Use
+        set_weight (or assign a new dict) to change the weights.
+    """
+    if self.weight is None:
+      return MappingProxyType({})
+    cols = self.cols
+    return MappingProxyType({divmod(k, cols): w for k, w in
+                             enumerate(self.weight) if w != 1})
+
+  @weights.setter
+  def weights(self, weights):
+    for cp in self.weights:
+      self.set_weight(cp, 1)
+    for cp, w in weights.items():
+      self.set_weight(cp, w)
+
+  def set_weight(self, cp, w):
+    """ set the cost of stepping into cp, an int from 0 to 65535 """
+    if not isinstance(w, int) or not 0 <= w <= 0xFFFF:
+      raise ValueError(f'weight must be an int from 0 to 65535, not {w!r}')
+    if not self.in_bounds(cp):
+      return
+    if self.weight is None:
+      if w == 1:
+        return
+      self.weight = array('H', [1]) * (self.rows * self.cols)
+    k = self.index(cp)
+    if self.weight[k] != w:
+      self.weight[k] = w
+      self.changed(cp)
+
+  def watch(self, func):
+    """ call func(cp) after every wall or weight change at cp """
+    self.watchers.append(func)
+
+  def unwatch(self, func):
+    self.watchers.remove(func)
+
+  def changed(self, cp):
+    """ patch the neighbor index and tell the watchers about cp """
+    self.version += 1
+    self.patch_index(cp)
+    for func in self.watchers:
+      func(cp)
+
+  def build_index(self):
+    """ Precompute a bitmask of open steps for every cell.
+        Bit b is set when STEPS[b] leads to an in-bounds open cell,
+        and the PARITY bit is set on odd cells.
+        add_wall/remove_wall patch the index locally from then on.
+    """
+    rows, cols, cells = self.rows, self.cols, self.cells
+    nbr = bytearray(rows * cols)
+    k = 0
+    for r in range(rows):
+      for c in range(cols):
+        m = PARITY if (r + c) & 1 else 0
+        for b, (dr, dc) in enumerate(STEPS):
+          i, j = r + dr, c + dc
+          if 0 <= i < rows and 0 <= j < cols and not cells[i * cols + j]:
+            m |= 1 << b
+        nbr[k] = m
+        k += 1
+    self.nbr = nbr
+
+  def id_steps(self):
+    """ STEP_TABLE as flat index offsets for this grid """
+    cols = self.cols
+    return [tuple(dr * cols + dc for dr, dc in steps) for steps in STEP_TABLE]
+
+  def patch_index(self, cp):
+    """ update the bits of the cells around cp after cp changed """
+    nbr = self.nbr
+    if nbr is None:
+      return
+    r, c = cp
+    rows, cols = self.rows, self.cols
+    is_open = not self.cells[r * cols + c]
+    for b, (dr, dc) in enumerate(STEPS):
+      i, j = r + dr, c + dc
+      if 0 <= i < rows and 0 <= j < cols:
+        bit = 1 << OPPOSITE[b]
+        k = i * cols + j
+        if is_open:
+          nbr[k] |= bit
+        else:
+          nbr[k] &= ~bit
+
+  def is_wall(self, cp):
+    return self.in_bounds(cp) and self.cells[self.index(cp)] == 1
 
   def add_wall(self, cp):
-    self.walls.append(cp)
+    if not self.in_bounds(cp):
+      return
+    k = self.index(cp)
+    if not self.cells[k]:
+      self.cells[k] = 1
+      self.nwalls += 1
+      self.changed(cp)
+
+  def remove_wall(self, cp):
+    if not self.in_bounds(cp):
+      return
+    k = self.index(cp)
+    if self.cells[k]:
+      self.cells[k] = 0
+      self.nwalls -= 1
+      self.changed(cp)
 
   def toggle_wall(self, cp):
-    if cp in self.walls:
-      self.walls.remove(cp)
+    if self.is_wall(cp):
+      self.remove_wall(cp)
     else:
-      self.walls.append(cp)
+      self.add_wall(cp)
 
   def cost(self, a, b):
     """ cost from a to b """
-    return self.weights.get(b, 1)
+    if self.weight is None:
+      return 1
+    r, c = b
+    return self.weight[r * self.cols + c]
 
   def in_bounds(self, cp):
     """ true if cp is within the bounds of the grid """
@@ -40,33 +225,250 @@ class Grid:
 
   def passable(self, cp):
     """ true if cp is not blocked """
-    return cp not in self.walls
+    r, c = cp
+    if 0 <= r < self.rows and 0 <= c < self.cols:
+      return not self.cells[r * self.cols + c]
+    return True
 
   def neighbors(self, cp):
     """ return all possible steps from cp """
     r, c = cp
+    if self.nbr is not None:
+      return [(r + dr, c + dc) for dr, dc in
+              STEP_TABLE[self.nbr[r * self.cols + c]]]
+    rows, cols, cells = self.rows, self.cols, self.cells
     steps = [(r + 1, c), (r - 1, c), (r, c - 1), (r, c + 1)]
     if (r + c) % 2 == 0:
       steps.reverse()
-    steps = filter(self.in_bounds, steps)
-    steps = filter(self.passable, steps)
-    return steps
+    return [(i, j) for i, j in steps
+            if 0 <= i < rows and 0 <= j < cols and not cells[i * cols + j]]
+
+
+class Components:
+  """ Connected regions of open cells, labelled per cell (-1 = wall).
+      Opening a cell merges the regions around it by relabelling the
+      smaller ones.  Closing a cell can split its region: a BFS runs
+      from each open neighbour in turn, searches that meet are merged,
+      and each search that runs dry before the others is a new region.
+      Only the split-off pieces are relabelled.
+  """
+  def __init__(self, grid):
+    self.grid = grid
+    self.labels = array('i', [-1]) * (grid.rows * grid.cols)
+    self.sizes = {}
+    self.next_label = 0
+    for k, wall in enumerate(grid.cells):
+      if not wall and self.labels[k] < 0:
+        self.relabel(k, self.new_label())
+    grid.components = self
+    grid.watch(self.update)
+
+  def close(self):
+    """ stop watching the grid """
+    self.grid.unwatch(self.update)
+    self.grid.components = None
+
+  def new_label(self):
+    self.next_label += 1
+    self.sizes[self.next_label] = 0
+    return self.next_label
+
+  def around(self, k):
+    """ in-bounds 4-neighbour ids of k """
+    rows, cols = self.grid.rows, self.grid.cols
+    r, c = divmod(k, cols)
+    ids = []
+    if r > 0:
+      ids.append(k - cols)
+    if r < rows - 1:
+      ids.append(k + cols)
+    if c > 0:
+      ids.append(k - 1)
+    if c < cols - 1:
+      ids.append(k + 1)
+    return ids
+
+  def relabel(self, k, label):
+    """ flood label over the open region around k """
+    labels, cells, sizes = self.labels, self.grid.cells, self.sizes
+    replaced = set()
+    if labels[k] >= 0:
+      replaced.add(labels[k])
+      sizes[labels[k]] -= 1
+    labels[k] = label
+    count = 1
+    stack = [k]
+    while stack:
+      x = stack.pop()
+      for y in self.around(x):
+        if not cells[y] and labels[y] != label:
+          if labels[y] >= 0:
+            replaced.add(labels[y])
+            sizes[labels[y]] -= 1
+          labels[y] = label
+          count += 1
+          stack.append(y)
+    sizes[label] += count
+    for old in replaced:
+      if not sizes[old]:
+        del sizes[old]
+
+  def update(self, cp):
+    """ grid watcher """
+    k = self.grid.index(cp)
+    is_open = not self.grid.cells[k]
+    if is_open == (self.labels[k] >= 0):
+      return  # a weight change, or nothing new
+    if is_open:
+      self.opened(k)
+    else:
+      self.closed(k)
+
+  def opened(self, k):
+    labels, sizes = self.labels, self.sizes
+    near = {labels[y] for y in self.around(k) if labels[y] >= 0}
+    if not near:
+      label = self.new_label()
+    else:
+      label = max(near, key=sizes.get)
+    labels[k] = label
+    sizes[label] += 1
+    for y in self.around(k):
+      if labels[y] >= 0 and labels[y] != label:
+        self.relabel(y, label)
+
+  def closed(self, k):
+    labels, cells, sizes = self.labels, self.grid.cells, self.sizes
+    old = labels[k]
+    labels[k] = -1
+    sizes[old] -= 1
+    seeds = [y for y in self.around(k) if labels[y] == old]
+    if not seeds:
+      del sizes[old]
+      return
+    owner = {}
+    parent = list(range(len(seeds)))
+    queues = [deque([y]) for y in seeds]
+    members = [[y] for y in seeds]
+    for i, y in enumerate(seeds):
+      owner[y] = i
+    active = set(range(len(seeds)))
 
+    def find(i):
+      while parent[i] != i:
+        i = parent[i]
+      return i
 
-def rand_grid(rows, cols, walls):
-  """ Create a random grid with a_node and b_node """
+    while len(active) > 1:
+      for i in sorted(active):
+        if i not in active:
+          continue
+        if not queues[i]:
+          # ran dry first, so this piece is cut off from the rest
+          active.discard(i)
+          label = self.new_label()
+          for x in members[i]:
+            labels[x] = label
+          sizes[label] = len(members[i])
+          sizes[old] -= len(members[i])
+          if len(active) == 1:
+            break
+          continue
+        x = queues[i].popleft()
+        for y in self.around(x):
+          if cells[y]:
+            continue
+          j = owner.get(y)
+          if j is None:
+            owner[y] = i
+            members[i].append(y)
+            queues[i].append(y)
+            continue
+          j = find(j)
+          if j != i:
+            parent[j] = i
+            queues[i].extend(queues[j])
+            members[i].extend(members[j])
+            queues[j].clear()
+            members[j] = []
+            active.discard(j)
+        if len(active) == 1:
+          break
+
+  def connected(self, a, b):
+    """ False when b can certainly not be reached from a """
+    grid, labels = self.grid, self.labels
+    if a == b or not (grid.in_bounds(a) and grid.in_bounds(b)):
+      return True
+    lb = labels[grid.index(b)]
+    if lb < 0:
+      return False
+    ka = grid.index(a)
+    if labels[ka] >= 0:
+      return labels[ka] == lb
+    return any(labels[y] == lb for y in self.around(ka))
+
+
+def rand_open(grid, exclude=None):
+  """ random open cell other than exclude """
+  while 1:
+    cp = uRandom.rand_point(grid.rows - 1, grid.cols - 1)
+    if grid.passable(cp) and cp != exclude:
+      return cp
+
+
+def rand_grid(rows, cols, walls, connected=False):
+  """ Create a random grid with a_node and b_node.  With connected the
+      grid gets a Components index and b_node is drawn from the region
+      of a_node.
+  """
   grid = Grid(rows, cols)
-  grid.walls = []
-  while len(grid.walls) < walls:
+  while grid.nwalls < walls:
     cp = uRandom.rand_point(rows - 1, cols - 1)
-    if cp not in grid.walls:
-      grid.walls.append(cp)
-  while 1:
-    start = uRandom.rand_point(rows - 1, cols - 1)
-    if start not in grid.walls:
-      break
-  while 1:
-    goal = uRandom.rand_point(rows - 1, cols - 1)
-    if goal not in grid.walls and goal != start:
-      break
+    grid.add_wall(cp)
+  if not connected:
+    start = rand_open(grid)
+    goal = rand_open(grid, start)
+    return grid, start, goal
+  index = Components(grid)
+  labels, sizes = index.labels, index.sizes
+  ids = [k for k, label in enumerate(labels) if label >= 0 and sizes[label] > 1]
+  if not ids:
+    raise ValueError('no two open cells are connected')
+  a = random.choice(ids)
+  ids = [k for k in ids if labels[k] == labels[a] and k != a]
+  b = random.choice(ids)
+  return grid, grid.point(a), grid.point(b)
+
+
+def rand_maze(rows, cols, loops=0):
+  """ Maze carved by a random depth first walk over the cells with even
+      row and column.  Then loops walls between two such cells are
+      knocked out, so the maze has cycles.  Returns grid, a_node and
+      b_node like rand_grid.
+  """
+  cells = bytearray([1]) * (rows * cols)
+  cells[0] = 0
+  stack = [(0, 0)]
+  while stack:
+    r, c = stack[-1]
+    options = [(dr, dc) for dr, dc in STEPS
+               if 0 <= r + 2*dr < rows and 0 <= c + 2*dc < cols and
+               cells[(r + 2*dr) * cols + c + 2*dc]]
+    if not options:
+      stack.pop()
+      continue
+    dr, dc = random.choice(options)
+    cells[(r + dr) * cols + c + dc] = 0
+    cells[(r + 2*dr) * cols + c + 2*dc] = 0
+    stack.append((r + 2*dr, c + 2*dc))
+  for i in range(loops):
+    if random.random() < 0.5:
+      r, c = random.randrange(0, rows, 2), random.randrange(1, cols - 1, 2)
+    else:
+      r, c = random.randrange(1, rows - 1, 2), random.randrange(0, cols, 2)
+    cells[r * cols + c] = 0
+  grid = Grid.from_buffer(rows, cols, cells)
+  start = rand_open(grid)
+  goal = rand_open(grid, start)
   return grid, start, goal